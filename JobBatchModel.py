@@ -0,0 +1,412 @@
+import numpy as np
+import JobModel
+from JobModel import Scenario
+from JobPlacement import ActionCache, ColumnProfile, enumerate_placements
+
+NUM_SLOTS = JobModel.NUM_BLOCKS     # Default number of jobs of the job list that can be placed, as in ScheduleModel
+
+
+class BatchScheduleModel:
+    """
+    batch_size episodes of ScheduleModel stepped together.
+    The grids are one (batch_size, HEIGHT, WIDTH) circular array, with one row offset per episode,
+    and the job lists are (batch_size, jobs) tables, so commit, add_time, remove_bottom and the bottom full
+    checks are a few NumPy operations for all the episodes. Only the placement search is still done per job,
+    its results are kept in a (batch_size, num_slots, delays) action table.
+    The slots show the first num_slots jobs of each job list, as a ScheduleModel without a ranking.
+    Every episode plays exactly the same game as an independent ScheduleModel given the same actions.
+    """
+    scenario: Scenario
+    batch_size: int
+    num_slots: int
+    HEIGHT: int
+    WIDTH: int
+    delays: int
+    type_ids: np.ndarray
+    part_col: np.ndarray
+    part_len: np.ndarray
+    num_parts: np.ndarray
+    release: np.ndarray
+    row_type: np.ndarray
+    buffer: np.ndarray
+    offset: np.ndarray
+    versions: np.ndarray
+    base_time: np.ndarray
+    max_time: np.ndarray
+    num_jobs: np.ndarray
+    pending: np.ndarray
+    total_reward: np.ndarray
+    step_reward: np.ndarray
+    game_over: np.ndarray
+    job_count: np.ndarray
+    job_row: np.ndarray
+    job_type: np.ndarray
+    job_part: np.ndarray
+    job_curr_time: np.ndarray
+    job_appear: np.ndarray
+    history: np.ndarray
+    history_length: np.ndarray
+    action_table: np.ndarray
+    action_valid: np.ndarray
+    slot_states: list[list[tuple]]
+    caches: list[ActionCache]
+
+    def __init__(self, batch_size: int, scenario: Scenario = None, num_slots: int = NUM_SLOTS):
+        if scenario is None:
+            scenario = JobModel.default_scenario()
+        self.scenario = scenario
+        self.batch_size = batch_size
+        self.num_slots = num_slots
+        hidden_rows = scenario.max_setup_time
+        self.HEIGHT = JobModel.NUM_HEIGHT + hidden_rows         # Height of the grid (including hidden rows)
+        self.WIDTH = int(scenario.grid_info[3])                 # Width of the grid (M)
+        self.delays = self.HEIGHT - hidden_rows                 # Number of delays of an action
+
+        # Per job type: grid id, and the drop column and length of each part (see JobType)
+        kinds = list(scenario.job_types.values())
+        type_index = {kind.name: kind.index for kind in kinds}
+        max_parts = max(len(kind) for kind in kinds)
+        self.type_ids = np.array([kind.id for kind in kinds], dtype=np.int64)
+        self.part_col = np.zeros((len(kinds), max_parts), dtype=np.int64)
+        self.part_len = np.zeros((len(kinds), max_parts), dtype=np.int64)
+        self.num_parts = np.array([len(kind) for kind in kinds], dtype=np.int64)
+        for kind in kinds:
+            self.part_col[kind.index, :len(kind)] = kind.order
+            self.part_len[kind.index, :len(kind)] = kind.lengths
+
+        # Per job, by release time (see Scenario.arrival_order): release time and job type
+        if scenario.stream_jobs:
+            raise ValueError("BatchScheduleModel needs the jobs in memory, load the scenario without stream_jobs")
+        self.release = np.asarray(scenario.arrival_times)
+        self.row_type = np.array([type_index[scenario.jobs[row][1]] for row in scenario.arrival_order], dtype=np.int64)
+
+        # State of the episodes
+        shape = (batch_size,)
+        num_rows = max(len(scenario.jobs), 1)
+        dtype = JobModel.grid_dtype(scenario.num_types)                             # Type of the grid cells, as in ScheduleModel
+        self.buffer = np.zeros((batch_size, self.HEIGHT, self.WIDTH), dtype=dtype)  # Circular grids, logical row y is (offset + y) % HEIGHT
+        self.offset = np.zeros(shape, dtype=np.int64)
+        self.versions = np.zeros((batch_size, self.WIDTH), dtype=np.int64)          # Number of writes into each column
+        self.base_time = np.zeros(shape, dtype=np.int64)
+        self.max_time = np.zeros(shape, dtype=np.int64)
+        self.num_jobs = np.zeros(shape, dtype=np.int64)
+        self.pending = np.zeros(shape, dtype=np.int64)                              # Number of jobs released (index into release)
+        self.total_reward = np.zeros(shape, dtype=np.int64)
+        self.step_reward = np.zeros(shape, dtype=np.int64)
+        self.game_over = np.zeros(shape, dtype=bool)
+
+        # Job lists, the first job_count columns of each row are used
+        self.job_count = np.zeros(shape, dtype=np.int64)
+        self.job_row = np.zeros((batch_size, num_rows), dtype=np.int64)            # Index into release, identifies the job
+        self.job_type = np.zeros((batch_size, num_rows), dtype=np.int64)
+        self.job_part = np.zeros((batch_size, num_rows), dtype=np.int64)           # Number of dropped parts
+        self.job_curr_time = np.zeros((batch_size, num_rows), dtype=np.int64)
+        self.job_appear = np.zeros((batch_size, num_rows), dtype=np.int64)
+
+        # History of the grids, the first history_length rows of each episode are used
+        self.history = np.zeros((batch_size, JobModel.HISTORY_CHUNK_ROWS, self.WIDTH), dtype=dtype)
+        self.history_length = np.zeros(shape, dtype=np.int64)
+
+        # Available actions: (place row, setup before, setup after, slack) of each (slot, delay)
+        self.action_table = np.zeros((batch_size, self.num_slots, self.delays, 4), dtype=np.int64)
+        self.action_valid = np.zeros((batch_size, self.num_slots, self.delays), dtype=bool)
+        self.slot_states = [[None] * self.num_slots for _ in range(batch_size)]
+        self.caches = [ActionCache() for _ in range(batch_size)]
+
+        self.reset()
+
+    def reset(self, mask: np.ndarray = None):
+        """
+        Start a new game in the episodes of mask (all of them by default).
+        """
+        idx = np.arange(self.batch_size) if mask is None else np.flatnonzero(mask)
+        self.buffer[idx] = 0
+        self.offset[idx] = 0
+        self.versions[idx] = 0
+        self.base_time[idx] = 0
+        self.max_time[idx] = JobModel.NUM_HEIGHT
+        self.num_jobs[idx] = min(int(self.scenario.grid_info[1]), len(self.release))   # The job file may have fewer jobs than its header
+        self.pending[idx] = 0
+        self.total_reward[idx] = 0
+        self.step_reward[idx] = 0
+        self.game_over[idx] = False
+        self.job_count[idx] = 0
+        self.history_length[idx] = 0
+        self.action_valid[idx] = False
+        for b in idx:
+            self.slot_states[b] = [None] * self.num_slots
+            self.caches[b].clear()
+
+        self.release_jobs(idx, start=True)
+        self.check_status(idx)
+        self.update_actions(idx)
+
+    def step(self, actions: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Execute one action per episode, as ScheduleModel.execute_move.
+        actions is a (batch_size, 2) array of (block, delay) or a (batch_size,) array of flat indices,
+        the finished episodes ignore their action.
+        return the step rewards and the game over flags.
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        if actions.ndim == 1:
+            actions = JobModel.decode_actions(actions, self.delays)
+        actions = actions.reshape(self.batch_size, 2)
+        block, delay = actions[:, 0], actions[:, 1]
+        active = ~self.game_over
+        placed = active & (block > 0)
+        idx = np.flatnonzero(placed)
+        slot, delay = block[idx] - 1, delay[idx]
+        valid = (slot < self.num_slots) & (delay >= 0) & (delay < self.delays)
+        valid[valid] = self.action_valid[idx[valid], slot[valid], delay[valid]]
+        if not valid.all():
+            raise ValueError(f"Unavailable actions in episodes {idx[~valid].tolist()}")
+
+        self.step_reward[active] = 0
+        self.add_time(np.flatnonzero(active & (block == 0)))
+        self.commit(idx, slot, delay)
+        stepped = np.flatnonzero(active)
+        self.check_status(stepped)
+        self.update_actions(stepped)
+        return self.step_reward, self.game_over
+
+    def commit(self, idx: np.ndarray, slot: np.ndarray, delay: np.ndarray):
+        """
+        Place the next part of the job of slot with delay, in each episode of idx.
+        """
+        if not len(idx):
+            return
+        height = self.HEIGHT
+        hidden_rows = self.scenario.max_setup_time
+        row, setup_before, setup_after, slack = self.action_table[idx, slot, delay].T
+        job_type = self.job_type[idx, slot]
+        part = self.job_part[idx, slot]
+        col = self.part_col[job_type, part]
+        drop_len = self.part_len[job_type, part]
+
+        # Bounds of the setup, part, slack and next setup segments, written in this order
+        # (rows past the top wrap around, as with ScheduleGrid.set_cells)
+        part_start = row + setup_before
+        part_end = part_start + drop_len
+        slack_end = part_end + slack
+        end = slack_end + setup_after
+        rows = np.arange(height)[None, :]
+        physical = (self.offset[idx, None] + rows) % height
+        column = self.buffer[idx[:, None], physical, col[:, None]]
+        for start, stop, value in ((row, part_start, 1), (part_start, part_end, self.type_ids[job_type]),
+                                   (part_end, slack_end, 0), (slack_end, end, 1)):
+            covered = (rows - start[:, None]) % height < (stop - start)[:, None]
+            column = np.where(covered, np.broadcast_to(value, idx.shape)[:, None], column)
+        self.buffer[idx[:, None], physical, col[:, None]] = column
+        self.versions[idx, col] += 1
+
+        # Update the jobs, the finished ones give their reward and leave the job list
+        self.job_part[idx, slot] += 1
+        self.job_curr_time[idx, slot] = self.base_time[idx] + part_end - hidden_rows
+        finished = self.job_part[idx, slot] == self.num_parts[job_type]
+        done = idx[finished]
+        reward = self.job_appear[done, slot[finished]] - (end[finished] - hidden_rows + self.base_time[done])
+        self.step_reward[done] = reward
+        self.total_reward[done] += reward
+        for b, s in zip(done, slot[finished]):
+            self.caches[b].discard(int(self.job_row[b, s]))
+        self.remove_jobs(done, slot[finished])
+
+    def remove_jobs(self, idx: np.ndarray, slot: np.ndarray):
+        """
+        Remove the job of slot from the job list of each episode of idx, the following jobs move up one slot.
+        """
+        if not len(idx):
+            return
+        columns = np.arange(self.job_row.shape[1])[None, :]
+        source = np.minimum(columns + (columns >= slot[:, None]), columns.shape[1] - 1)
+        for table in (self.job_row, self.job_type, self.job_part, self.job_curr_time, self.job_appear):
+            table[idx] = np.take_along_axis(table[idx], source, axis=1)
+        self.job_count[idx] -= 1
+
+    def release_jobs(self, idx: np.ndarray, start: bool = False):
+        """
+        Add the jobs released at the current time to the job lists of the episodes of idx.
+        """
+        num_rows = len(self.release)
+        while len(idx):
+            pending = self.pending[idx]
+            ready = (pending < num_rows) & (self.release[np.minimum(pending, num_rows - 1)] <= self.base_time[idx])
+            if not start:
+                ready &= self.num_jobs[idx] > 0
+            idx = idx[ready]
+            slot = self.job_count[idx]
+            self.job_row[idx, slot] = self.pending[idx]
+            self.job_type[idx, slot] = self.row_type[self.pending[idx]]
+            self.job_part[idx, slot] = 0
+            self.job_curr_time[idx, slot] = 0
+            self.job_appear[idx, slot] = self.release[self.pending[idx]]
+            self.job_count[idx] += 1
+            self.pending[idx] += 1
+            self.num_jobs[idx] -= 1
+
+    def add_time(self, idx: np.ndarray):
+        """
+        Time goes by one unit in the episodes of idx.
+        """
+        if not len(idx):
+            return
+        self.base_time[idx] += 1
+        self.max_time[idx] += 1
+        self.release_jobs(idx)
+        self.remove_bottom(idx)
+
+    def remove_bottom(self, idx: np.ndarray):
+        """
+        Drop the oldest hidden row of the grids of idx into their history, every row moves down by one.
+        """
+        physical = self.offset[idx]
+        self.append_history(idx, self.buffer[idx, physical][:, None, :])
+        self.buffer[idx, physical] = 0
+        self.offset[idx] = (physical + 1) % self.HEIGHT
+
+    def check_bottom_full(self, idx: np.ndarray) -> np.ndarray:
+        """
+        Check if the bottom line of the grids of idx is full.
+        """
+        bottom = (self.offset[idx] + self.scenario.max_setup_time) % self.HEIGHT
+        return np.all(self.buffer[idx, bottom] != 0, axis=1)
+
+    def check_status(self, idx: np.ndarray):
+        """
+        Same as ScheduleModel.check_status for the episodes of idx: the time goes by while the bottom line
+        is full or the job list is empty, and the game ends when no job is left.
+        When the game ends, ScheduleModel adds the grid to the history one more time than the number of
+        time steps added here (see ScheduleModel.check_status).
+        """
+        depth = np.zeros(self.batch_size, dtype=np.int64)
+        while len(idx):
+            full = self.check_bottom_full(idx)
+            empty = self.job_count[idx] == 0
+            remaining = self.num_jobs[idx] > 0
+            ended = idx[~full & empty & ~remaining]
+            for b in ended:
+                self.end_game(b, depth[b] + 1)
+            idx = idx[full | (empty & remaining)]
+            self.add_time(idx)
+            depth[idx] += 1
+
+    def end_game(self, b: int, copies: int = 1):
+        """
+        End the game of the episode b, its grid is appended to its history.
+        """
+        self.game_over[b] = True
+        grid = np.tile(self.grid(b), (copies, 1))
+        self.append_history(np.array([b]), grid[None])
+
+    def append_history(self, idx: np.ndarray, rows: np.ndarray):
+        """
+        Append rows, a (len(idx), k, WIDTH) array, to the history of each episode of idx.
+        """
+        if not len(idx):
+            return
+        k = rows.shape[1]
+        needed = int(self.history_length[idx].max()) + k
+        if needed > self.history.shape[1]:
+            capacity = max(needed, 2 * self.history.shape[1])
+            history = np.zeros((self.batch_size, capacity, self.WIDTH), dtype=self.history.dtype)
+            history[:, :self.history.shape[1]] = self.history
+            self.history = history
+        self.history[idx[:, None], self.history_length[idx, None] + np.arange(k)] = rows
+        self.history_length[idx] += k
+
+    def update_actions(self, idx: np.ndarray):
+        """
+        Search the placements of the first num_slots jobs of each episode of idx into the action table.
+        A slot is only searched again when its job or the state of the job changed.
+        """
+        hidden_rows = self.scenario.max_setup_time
+        # Read the tables once as lists, scalar reads of NumPy arrays are slow
+        counts = np.minimum(self.job_count[idx], self.num_slots).tolist()
+        rows = self.job_row[idx, :self.num_slots].tolist()
+        types = self.job_type[idx, :self.num_slots].tolist()
+        parts = self.job_part[idx, :self.num_slots].tolist()
+        curr_times = self.job_curr_time[idx, :self.num_slots].tolist()
+        versions = self.versions[idx].tolist()
+        base_times = self.base_time[idx].tolist()
+        part_col = self.part_col.tolist()
+        for i, b in enumerate(idx.tolist()):
+            states = self.slot_states[b]
+            count = counts[i]
+            base_time = base_times[i]
+            for s in range(self.num_slots):
+                if s >= count:
+                    if states[s] is not None:
+                        self.action_valid[b, s] = False
+                        states[s] = None
+                    continue
+                uid = rows[i][s]
+                job_type = types[i][s]
+                part = parts[i][s]
+                col = part_col[job_type][part]
+                curr_time = curr_times[i][s]
+                version = versions[i][col]
+                state = (part, curr_time, version, base_time)
+                if states[s] == (uid, state):
+                    continue
+
+                cache = self.caches[b]
+                placements = cache.get_placements(uid, state)
+                if placements is None:
+                    profile = cache.get_profile(col, version, base_time)
+                    if profile is None:
+                        profile = ColumnProfile.from_column(self.column(b, col))
+                        cache.store_profile(col, version, base_time, profile)
+                    type_id = int(self.type_ids[job_type])
+                    col_setup = self.scenario.setup_tensor[col % self.scenario.num_cols]
+                    after_previous_part = curr_time > base_time
+                    start_row = curr_time - base_time + hidden_rows if after_previous_part else hidden_rows
+                    row_limit = int(self.max_time[b]) + 2 * hidden_rows
+                    placements = enumerate_placements(profile, int(self.part_len[job_type, part]), start_row, after_previous_part,
+                                                      col_setup[:, type_id], col_setup[type_id], row_limit)
+                    cache.store(uid, state, s, placements, None, None)
+
+                table = placements.table
+                table = table[table[:, 0] < self.delays]
+                self.action_valid[b, s] = False
+                self.action_valid[b, s, table[:, 0]] = True
+                self.action_table[b, s, table[:, 0]] = table[:, 1:]
+                states[s] = (uid, state)
+
+    def grid(self, b: int) -> np.ndarray:
+        """
+        Get a copy of the logical grid of the episode b, row 0 is the oldest hidden row.
+        """
+        return np.roll(self.buffer[b], -int(self.offset[b]), axis=0)
+
+    def column(self, b: int, col: int) -> np.ndarray:
+        """
+        Get a copy of the logical column col of the episode b.
+        """
+        return np.roll(self.buffer[b, :, col], -int(self.offset[b]))
+
+    def get_history(self, b: int) -> np.ndarray:
+        """
+        Get the history rows of the episode b, oldest row first.
+        """
+        return self.history[b, :self.history_length[b]]
+
+    def get_available_actions(self, b: int) -> list[tuple[int, int]]:
+        """
+        Get the available actions of the episode b, in the same order as ScheduleModel.get_available_actions.
+        """
+        actions = [(0, 0)]
+        for s in range(self.num_slots):
+            actions.extend((s + 1, delay) for delay in np.flatnonzero(self.action_valid[b, s]).tolist())
+        return actions
+
+    def action_masks(self, out: np.ndarray = None) -> np.ndarray:
+        """
+        Get the (batch_size, 1 + num_slots * delays) mask of the available actions,
+        indexed by flat action (see JobModel.encode_action).
+        """
+        if out is None:
+            out = np.zeros((self.batch_size, 1 + self.num_slots * self.delays), dtype=bool)
+        out[:, 0] = True
+        out[:, 1:] = self.action_valid.reshape(self.batch_size, -1)
+        return out
@@ -1,61 +1,169 @@
-import pygame
 import JobModel
 import JobUtils
 import gymnasium as gym
 import numpy as np
+from JobRenderer import NumpyRenderer
+try:
+    import pygame
+except ImportError:     # pygame is only needed for the human mode and the pygame renderer
+    pygame = None
 
 SCREEN_SIZE = (1920, 1080)   # Set the screen size for rendering, also used for size of grb_array
 DEBUG_SHOW_HIDDEN = False   # Set to True to show the hidden part of the grid (for debugging)
+OBS_DTYPE = None           # Type of the grid and job values in the symbolic observation (None for the grid type of the model)
 
 class JobSchedulerEnv(gym.Env):
+    scenario: JobModel.Scenario
+    num_slots: int
+    ranking: type
     model: JobModel.ScheduleModel
     action_space: gym.spaces.Discrete
-    observation_space: gym.spaces.Box
-    window: pygame.Surface
+    observation_space: gym.spaces.Space
+    obs_mode: str
+    renderer: str
+    rasterizer: NumpyRenderer
+    window: "pygame.Surface"
+    canvas: "pygame.Surface"
+    last_frame: np.ndarray
+    steps: int
+    frame_step: int
+    lazy_obs: bool
+    render_interval: int
 
     metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 60}
     # The render_fps serves no purpose in this environment, as the rendering is done in the step function.
     # The game loop will be controlled by the environment's step function, not the rendering.
 
-    def __init__(self, render_mode="human"):
-        # Initialize the Job model
-        self.model = JobModel.ScheduleModel()
+    def __init__(self, render_mode="human", scenario: JobModel.Scenario = None, obs_mode="rgb", renderer="pygame", screen_size=SCREEN_SIZE,
+                 lazy_obs=False, render_interval=1, num_slots=JobModel.NUM_BLOCKS, ranking=None):
+        if pygame is None and (renderer == "pygame" or render_mode == "human"):
+            raise ImportError('pygame is needed for the human mode and the pygame renderer, install it or use renderer="numpy" with render_mode="rgb_array"')
+
+        # Initialize the Job model, the scenario is shared by all the episodes
+        # num_slots jobs of the job list can be placed, picked by the ranking (a JobRanking subclass, None for the job list order)
+        self.scenario = scenario if scenario is not None else JobModel.default_scenario()
+        self.num_slots = num_slots
+        self.ranking = ranking
+        self.model = JobModel.ScheduleModel(self.scenario, num_slots=num_slots, ranking=ranking)
         self.model.start_game()
         action_space_size = self.model.get_action_space_size()
         grid_shape = self.model.grid.grid.shape
         self.window = None
+        self.font = None
+        self.canvas = None
+        self.last_frame = None
+        self.steps = 0              # Number of steps since the reset, also tags the cached frame
+        self.frame_step = -1        # Step of the cached frame
+
+        # lazy_obs returns LazyObservation handles, the observation is only computed if it is accessed
+        # render_interval draws the human mode window every render_interval steps only
+        self.lazy_obs = lazy_obs
+        self.render_interval = render_interval
+
+        # renderer "numpy" draws the frames without pygame (no text labels), the human mode still needs pygame for the window
+        self.renderer = renderer
+        self.screen_size = screen_size if renderer == "numpy" else SCREEN_SIZE
+        self.rasterizer = NumpyRenderer(self.scenario.num_types, self.screen_size, num_slots, show_hidden=DEBUG_SHOW_HIDDEN) if renderer == "numpy" else None
 
         # Set up the gym environment
+        # obs_mode "rgb" observes the rendered canvas, "symbolic" a dictionary of small arrays (see symbolic_observation_space)
         self.render_mode = render_mode
+        self.obs_mode = obs_mode
         self.action_space = gym.spaces.Discrete(action_space_size)                              # TODO: Check if this is the correct way to define the action space
-        self.observation_space = gym.spaces.Box(low=0, high=255, shape=(*SCREEN_SIZE, 3), dtype=np.uint8)
+        if obs_mode == "rgb":
+            self.observation_space = gym.spaces.Box(low=0, high=255, shape=(*self.screen_size, 3), dtype=np.uint8)
+        elif obs_mode == "symbolic":
+            self.observation_space = symbolic_observation_space(self.model)
+        else:
+            raise ValueError(f"Unknown obs_mode: {obs_mode}")
 
-    def step(self, action: tuple[int, int]):
+    def step(self, action):
+        """
+        Execute the (block, delay) action, or its flat index in the action space (see JobModel.encode_action).
+        """
         self.model.execute_move(action)
-        return self.render(), self.model.step_reward, self.model.game_over, None
+        self.steps += 1
+        # The window is only drawn every render_interval steps (and on the last one)
+        if self.render_mode == "human" and (self.steps % self.render_interval == 0 or self.model.game_over):
+            self.render()
+        return self.observe(), self.model.step_reward, self.model.game_over, None
 
     def reset(self, seed=None):
         super().reset(seed=seed)
-        self.model = JobModel.ScheduleModel()
+        self.model.close()
+        self.model = JobModel.ScheduleModel(self.scenario, num_slots=self.num_slots, ranking=self.ranking)
         self.model.start_game()
-        return self.render(), None      # TODO: Info is None for now. Check if this is correct.
+        self.steps = 0
+        self.frame_step = -1
+        if self.render_mode == "human":
+            self.render()
+        return self.observe(), None      # TODO: Info is None for now. Check if this is correct.
+
+    def observe(self):
+        """
+        Get the observation of the current state, as a LazyObservation if lazy_obs is set.
+        """
+        if self.lazy_obs:
+            return LazyObservation(self, self.steps)
+        return self.materialize()
+
+    def materialize(self):
+        """
+        Compute the observation of the current state.
+        """
+        if self.obs_mode == "rgb":
+            return self.frame()
+        return symbolic_observation(self.model, allocate_observation(self.observation_space))
+
+    def frame(self) -> np.ndarray:
+        """
+        Get the rgb_array of the current state, drawn at most once per step.
+        """
+        if self.frame_step != self.steps:
+            if self.rasterizer is not None:
+                self.canvas = None
+                self.last_frame = self.rasterizer.render(self.model)
+            else:
+                self.canvas = self.draw_canvas()
+                self.last_frame = np.transpose(pygame.surfarray.array3d(self.canvas), (0, 1, 2))
+            self.frame_step = self.steps
+        return self.last_frame
 
     def render(self) -> np.ndarray:
-        pygame.init()
+        frame = self.frame()
+        # Output the canvas
+        if self.render_mode == "human":
+            if self.window is None:
+                pygame.init()
+                self.window = pygame.display.set_mode(self.screen_size)
+                pygame.display.set_caption("Job Scheduler")
+            if self.canvas is not None:
+                self.window.blit(self.canvas, self.canvas.get_rect())
+            else:
+                pygame.surfarray.blit_array(self.window, frame)
+            pygame.event.pump()
+            pygame.display.flip()
+        # Always return the canvas as rgb_array, even if the render_mode is "human"
+        return frame
+
+    def draw_canvas(self) -> "pygame.Surface":
+        """
+        Draw the current state on a pygame surface.
+        """
         # Initialize the pygame module
-        if self.window is None and self.render_mode == "human":
-            self.window = pygame.display.set_mode(SCREEN_SIZE)
-            pygame.display.set_caption("Job Scheduler")
-        
+        if self.font is None:
+            pygame.init()
+            self.font = pygame.font.Font(None, 24)
+
         # Create and draw on the canvas
-        canvas = pygame.Surface(SCREEN_SIZE)
+        canvas = pygame.Surface(self.screen_size)
         canvas.fill((200, 200, 200))
         top_text_margin = 20
-        slot_size = (SCREEN_SIZE[0] // 10, SCREEN_SIZE[1] - top_text_margin)
+        slot_size = (self.screen_size[0] // (self.num_slots + 1), self.screen_size[1] - top_text_margin)
 
         # Draw the grid on the left side of the screen
         # flip the y axis to draw the grid from bottom to top
-        hidden_height = JobModel.max_setup_time
+        hidden_height = self.model.scenario.max_setup_time
         grid_width = self.model.grid.WIDTH
         grid_height = self.model.grid.HEIGHT if DEBUG_SHOW_HIDDEN else self.model.grid.HEIGHT - hidden_height
         flipped_grid = self.model.grid.grid[::-1]
@@ -70,19 +178,14 @@ class JobSchedulerEnv(gym.Env):
             pygame.draw.line(canvas, (255, 0, 0), (0, (grid_height - curr_time) * block_size + top_text_margin), (grid_width * block_size, (grid_height - curr_time) * block_size + top_text_margin), 2)
 
         # label the current time
-        font = pygame.font.Font(None, 24)
+        font = self.font
         text = font.render(f"Time: {self.model.base_time}", True, (255, 0, 0))
         canvas.blit(text, (0, 0))
 
-        # Draw 9 jobs from the job list on each slot
-        job_list = self.model.job_list
-        for i in range(9):
+        # Draw the jobs of the window on each slot
+        for i, job in enumerate(self.model.window):
             starting_x = slot_size[0] * (i + 1)
-            if i >= len(job_list):
-                break
-            job = job_list[i]
             # Label the job block
-            font = pygame.font.Font(None, 24)
             text = font.render(f"{i + 1} Job type: {job.job_type}", True, (0, 0, 0))
             canvas.blit(text, (starting_x, 0))
             # Draw the job block
@@ -94,20 +197,100 @@ class JobSchedulerEnv(gym.Env):
                     else:
                         pygame.draw.rect(canvas, JobUtils.get_color(0), (x * block_size + starting_x, y * block_size + top_text_margin, block_size, block_size))
                     pygame.draw.rect(canvas, (255, 255, 255), (x * block_size + starting_x, y * block_size + top_text_margin, block_size, block_size), 1)
-        
-        # Output the canvas
-        if self.render_mode == "human":
-            self.window.blit(canvas, canvas.get_rect())
-            pygame.event.pump()
-            pygame.display.flip()
-        # Always return the canvas as rgb_array, even if the render_mode is "human"
-        return np.transpose(pygame.surfarray.array3d(canvas), (0, 1, 2))
+        return canvas
 
     def close(self):
+        self.model.close()
         if self.window is not None:
             pygame.display.quit()
             pygame.quit()
             self.window = None
 
     def get_available_actions(self):
-        return self.model.get_available_actions()
\ No newline at end of file
+        return self.model.get_available_actions()
+
+    @property
+    def action_mask(self) -> np.ndarray:
+        """
+        Mask of the available actions, indexed like the action space (read only, updated by each step).
+        """
+        return self.model.get_action_mask()
+
+class LazyObservation:
+    """
+    Handle of the observation of one step, computed on the first access.
+    It is only valid until the next step or reset of its environment, a late first access raises a RuntimeError.
+    Works with np.asarray for the rgb mode and indexes like a dictionary for the symbolic mode.
+    """
+    env: JobSchedulerEnv
+    step: int
+    value: object
+
+    def __init__(self, env: JobSchedulerEnv, step: int):
+        self.env = env
+        self.step = step
+        self.value = None
+
+    def get(self):
+        """
+        Get the observation, computing it if needed.
+        """
+        if self.value is None:
+            if self.env.steps != self.step:
+                raise RuntimeError(f"Observation of step {self.step} accessed after the environment moved to step {self.env.steps}")
+            self.value = self.env.materialize()
+        return self.value
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.get(), dtype=dtype)
+
+    def __getitem__(self, key):
+        return self.get()[key]
+
+def symbolic_observation_space(model: JobModel.ScheduleModel) -> gym.spaces.Dict:
+    """
+    Observation space of the symbolic observation mode:
+    grid: visible rows of the grid (row 0 is the current time), as grid ids,
+    jobs: remaining shape of the jobs of the K slots of the window (1 for each unit of work, padded with 0),
+    job_types: grid id of the jobs of the K slots (0 for an empty slot),
+    base_time: current time of the grid,
+    column_top: grid id of the top job of each column (0 for an empty column).
+    """
+    scenario = model.scenario
+    max_id = scenario.num_types + 1
+    visible_height = model.grid.HEIGHT - scenario.max_setup_time
+    shape_rows = max(i[1].shape[0] for i in scenario.job_data.values())
+    shape_width = max(i[1].shape[1] for i in scenario.job_data.values())
+    dtype = model.grid.dtype if OBS_DTYPE is None else OBS_DTYPE
+    return gym.spaces.Dict({
+        "grid": gym.spaces.Box(low=0, high=max_id, shape=(visible_height, model.grid.WIDTH), dtype=dtype),
+        "jobs": gym.spaces.Box(low=0, high=1, shape=(model.num_slots, shape_rows, shape_width), dtype=dtype),
+        "job_types": gym.spaces.Box(low=0, high=max_id, shape=(model.num_slots,), dtype=dtype),
+        "base_time": gym.spaces.Box(low=0, high=np.iinfo(np.int64).max, shape=(1,), dtype=np.int64),
+        "column_top": gym.spaces.Box(low=0, high=max_id, shape=(model.grid.WIDTH,), dtype=dtype),
+    })
+
+def allocate_observation(space: gym.spaces.Dict) -> dict[str, np.ndarray]:
+    """
+    Allocate zeroed arrays for an observation of the given space.
+    """
+    return {key: np.zeros(box.shape, dtype=box.dtype) for key, box in space.spaces.items()}
+
+def symbolic_observation(model: JobModel.ScheduleModel, out: dict[str, np.ndarray] = None) -> dict[str, np.ndarray]:
+    """
+    Get the symbolic observation of the model (see symbolic_observation_space).
+    If out is given, the observation is written into its arrays instead of new ones.
+    """
+    if out is None:
+        out = allocate_observation(symbolic_observation_space(model))
+    grid = model.grid
+    out["grid"][:] = grid.grid[model.scenario.max_setup_time:]
+    out["jobs"][:] = 0
+    out["job_types"][:] = 0
+    for i, job in enumerate(model.window):
+        out["jobs"][i, :job.shape.shape[0], :job.shape.shape[1]] = job.shape
+        out["job_types"][i] = job.id
+    out["base_time"][0] = model.base_time
+    for col, index in enumerate(grid.intervals):
+        out["column_top"][col] = next((value for value in reversed(index.values) if value > 1), 0)
+    return out
@@ -0,0 +1,80 @@
+import csv
+import os
+import sys
+import time
+
+POLL_INTERVAL = 0.5         # Seconds between two polls of the feed in the demo
+
+
+class JobFeed:
+    """
+    Local feed of new jobs for a running schedule: tails a csv file that another process appends rows to,
+    in the layout of the job info file (job index, job type, release time).
+    poll() returns the rows completed since the last call (a partly written last line waits for the next poll),
+    pump() submits them to a model between two moves (see ScheduleModel.submit_jobs).
+    """
+    path: str
+    offset: int
+
+    def __init__(self, path: str, from_start: bool = True):
+        self.path = path
+        self.offset = 0                 # File position after the last complete row read
+        if not from_start and os.path.exists(path):
+            self.offset = os.path.getsize(path)
+
+    def poll(self) -> list[tuple[str, int]]:
+        """
+        Get the (job type, release time) of the rows appended since the last poll.
+        Rows without an integer release time (headers, blank lines) are skipped.
+        """
+        try:
+            with open(self.path, "rb") as file:
+                if os.fstat(file.fileno()).st_size < self.offset:
+                    self.offset = 0         # The file was truncated, read it again from the start
+                file.seek(self.offset)
+                data = file.read()
+        except FileNotFoundError:
+            return []
+        end = data.rfind(b"\n") + 1
+        self.offset += end
+        jobs = []
+        for row in csv.reader(data[:end].decode("utf-8-sig").splitlines()):
+            if len(row) < 3:
+                continue
+            try:
+                jobs.append((row[1], int(row[2])))
+            except ValueError:
+                continue
+        return jobs
+
+    def pump(self, model) -> int:
+        """
+        Submit the new rows of the feed to the model, return the number of jobs submitted.
+        """
+        jobs = self.poll()
+        if jobs:
+            model.submit_jobs(jobs)
+        return len(jobs)
+
+
+if __name__ == "__main__":
+    # Usage: python JobFeed.py feed.csv
+    # Dispatches the jobs appended to feed.csv with a long-lived online model, placing the first available action
+    import JobModel
+
+    feed = JobFeed(sys.argv[1])
+    model = JobModel.ScheduleModel(online=True)
+    model.start_game()
+    while True:
+        submitted = feed.pump(model)
+        if submitted:
+            print(f"time {model.base_time}: {submitted} jobs submitted, {len(model.job_list)} in the job list")
+        actions = model.get_available_actions()
+        if len(actions) > 1:
+            model.execute_move(actions[1])
+            if model.step_reward:
+                print(f"time {model.base_time}: job finished, reward {model.step_reward}, total {model.total_reward}")
+        elif model.job_list or model.num_jobs > 0:
+            model.execute_move(actions[0])      # No room for the jobs yet or jobs released later, let the time go by
+        else:
+            time.sleep(POLL_INTERVAL)
@@ -0,0 +1,57 @@
+import copy
+import random
+import sys
+import time
+import JobModel
+
+NUM_STATES = 50             # Number of game states measured
+WARMUP_STEPS = 100          # Random moves played before measuring, so the grid and the history are not empty
+REPEATS = 200               # Number of timed calls per state
+
+
+def timed(function, repeats: int) -> float:
+    """
+    Get the mean time of a call of function, in microseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+if __name__ == "__main__":
+    # Usage: python JobForkBenchmark.py [num_states]
+    num_states = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_STATES
+    rng = random.Random(0)
+    totals = {"step": 0.0, "fork": 0.0, "snapshot + restore": 0.0, "copy.deepcopy": 0.0}
+    measured = 0
+    for _ in range(num_states):
+        model = JobModel.ScheduleModel(verbose=False)
+        model.start_game()
+        for _ in range(rng.randrange(WARMUP_STEPS)):
+            if model.game_over:
+                break
+            model.execute_move(rng.choice(model.get_available_actions()))
+        if model.game_over:
+            continue
+
+        # One step from the same state each time (restored from a snapshot, not timed)
+        snapshot = model.snapshot()
+        step_time = 0.0
+        for _ in range(REPEATS // 10):
+            model.restore(snapshot)
+            action = rng.choice(model.get_available_actions())
+            start = time.perf_counter()
+            model.execute_move(action)
+            step_time += time.perf_counter() - start
+        model.restore(snapshot)
+        totals["step"] += step_time / (REPEATS // 10) * 1e6
+        totals["fork"] += timed(model.fork, REPEATS)
+        totals["snapshot + restore"] += timed(lambda: model.restore(model.snapshot()), REPEATS)
+        totals["copy.deepcopy"] += timed(lambda: copy.deepcopy(model), REPEATS // 10)
+        measured += 1
+
+    step = totals["step"]
+    print(f"{measured} states")
+    for name, total in totals.items():
+        print(f"{name:20s} {total / measured:8.1f} us   {total / step:6.3f} x step")
@@ -14,7 +14,7 @@ def handle_key(key: int):
         selection = key
     else:
         global model
-        if (selection, key) in model.get_available_actions():
+        if model.is_available((selection, key)):
             model.execute_move((selection, key))
         selection = None
 
@@ -27,7 +27,7 @@ if __name__ == "__main__":
     pygame.init()
     pygame.display.set_caption("Job Scheduler")
     top_text_margin = 20
-    slot_size = (SCREEN_SIZE[0] // 10, SCREEN_SIZE[1] - top_text_margin)
+    slot_size = (SCREEN_SIZE[0] // (model.num_slots + 1), SCREEN_SIZE[1] - top_text_margin)
     screen = pygame.display.set_mode(SCREEN_SIZE)
     clock = pygame.time.Clock()
 
@@ -75,7 +75,7 @@ if __name__ == "__main__":
 
         # Draw the grid on the left side of the screen
         # flip the y axis to draw the grid from bottom to top
-        hidden_height = JobModel.max_setup_time
+        hidden_height = model.scenario.max_setup_time
         grid_width = model.grid.WIDTH
         grid_height = model.grid.HEIGHT if DEBUG_SHOW_HIDDEN else model.grid.HEIGHT - hidden_height
         flipped_grid = model.grid.grid[::-1]
@@ -96,13 +96,9 @@ if __name__ == "__main__":
         text = font.render(status_text, True, (255, 0, 0))
         screen.blit(text, (0, 0))
 
-        # Draw 9 jobs from the job list on each slot
-        job_list = model.job_list
-        for i in range(9):
+        # Draw the jobs of the window on each slot
+        for i, job in enumerate(model.window):
             starting_x = slot_size[0] * (i + 1)
-            if i >= len(job_list):
-                break
-            job = job_list[i]
             # Label the job block
             font = pygame.font.Font(None, 24)
             text = font.render(f"{i + 1} Job type: {job.job_type}", True, (0, 0, 0))
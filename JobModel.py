@@ -1,171 +1,756 @@
 from enum import IntEnum
 import numpy as np
-import csv
-from collections import deque
+import os
+import tempfile
+import weakref
+from JobPlacement import ActionCache, ColumnIndex, ColumnProfile, Placements, enumerate_placements
+from JobRanking import JobRanking
+from JobScenario import Scenario, JobType, PendingJobs, load_scenario, handle_type_info_file, handle_setup_file, compile_setup_tensor, get_job_model
 
 JOB_TYPE_PATH = "./new_data/type_info.csv"
 JOB_INFO_PATH = "./new_data/job_info.csv"
 SETUP_PATH = "./new_data/setup_info.csv"
 NUM_HEIGHT = 50
+HISTORY_CHUNK_ROWS = 1024       # Number of rows the grid history preallocates at a time
+HISTORY_SPILL_ROWS = None       # Spill the grid history into a memory-mapped file past this many rows (None to keep it in memory)
+HISTORY_SPILL_DIR = None        # Directory of the spill files (None for the system temp directory)
+NUM_BLOCKS = 9                  # Default number of slots of the job window (jobs of the job list that can be placed)
+GRID_DTYPE = None               # Type of the grid cells (None for the smallest unsigned type holding the grid ids of the scenario)
+HASH_SEED = 0x5EED              # Seed of the Zobrist keys of the grid cells
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15    # Odd 64-bit multiplier of the state hash (invertible modulo 2 ** 64)
+HASH_INVERSE = pow(HASH_MULTIPLIER, -1, 1 << 64)
+HASH_MASK = (1 << 64) - 1
 
+_hash_tables = {}       # (width, height, number of grid ids) -> read only Zobrist keys and multiplier powers, shared by the grids
+
+# Data of the default scenario, only set by initialize_job_data (kept for older scripts).
+# The model itself reads everything from its Scenario.
 job_data: dict
 job_id: dict # job id -> job name
 setup_rules: dict
+setup_tensor: np.ndarray
 num_types: int
 num_cols: int
 max_setup_time: int     # Maximum setup time
 max_job_height: int
 
 class Job:
-    id: int
-    job_type: str
-    piece_order: deque
-    shape: np.ndarray
-    rotated_shape: np.ndarray
+    """
+    A job piece: its type, the number of parts already dropped and its times.
+    Everything else is read from the precomputed tables of its type (see JobType),
+    so a waiting job costs a few dozen bytes and dropping a part only moves the cursor.
+    """
+    __slots__ = ("kind", "cursor", "curr_time", "appear_time")
+    kind: JobType
+    cursor: int
     curr_time: int
     appear_time: int
 
-    def __init__(self, name: str, time: int):
-        self.job_type = name
-        self.piece_order = job_data[name][0].copy()         # Order of the columns
-        self.shape = job_data[name][1].copy()               # Shape of the job piece
-        self.id = job_data[name][2]                         # ID of the job piece
-        self.rotated_shape = np.rot90(self.shape)           # Fixed shape of the job piece, for drawing
+    def __init__(self, name: str, time: int, scenario: Scenario):
+        self.kind = scenario.job_types[name]                # Operation tables of the job type
+        self.cursor = 0                                     # Number of parts dropped
         self.curr_time = 0                                  # Current height of the job piece, drop part can not be lower than this height
         self.appear_time = time                             # Time when the job piece appears
 
+    @property
+    def id(self) -> int:
+        """
+        ID of the job piece (grid id of its type).
+        """
+        return self.kind.id
+
+    @property
+    def job_type(self) -> str:
+        return self.kind.name
+
+    @property
+    def piece_order(self) -> tuple[int, ...]:
+        """
+        Order of the columns left to drop (1 based).
+        """
+        return self.kind.piece_orders[self.cursor]
+
+    @property
+    def shape(self) -> np.ndarray:
+        """
+        Shape of the parts left to drop (read only).
+        """
+        return self.kind.shapes[self.cursor]
+
+    @property
+    def rotated_shape(self) -> np.ndarray:
+        """
+        Shape of the job piece for drawing, same view as np.rot90(shape), only derived when drawn.
+        """
+        return self.kind.shapes[self.cursor][:, ::-1].T
+
+    @property
+    def remaining_parts(self) -> int:
+        return len(self.kind.order) - self.cursor
+
+    @property
+    def drop_col(self) -> int:
+        """
+        Column of the next part (0 based).
+        """
+        return self.kind.order[self.cursor]
+
+    @property
+    def drop_len(self) -> int:
+        """
+        Length of the next part.
+        """
+        return self.kind.lengths[self.cursor]
+
+    @property
+    def remaining_work(self) -> int:
+        """
+        Total length of the parts left to drop.
+        """
+        return self.kind.cumulative[-1] - self.kind.cumulative[self.cursor]
+
     def drop_block(self):
         """
         Drop one part of the job piece into the grid,
         update the parameters of the job piece.
+        return the length and the column of the part.
         """
-        # Update the shape, order of the job piece and the height
-        drop_col = self.piece_order.popleft() - 1
-        col_len = np.sum(self.shape[drop_col], axis=0) # length of 1 the column
+        kind = self.kind
+        cursor = self.cursor
+        self.cursor = cursor + 1
+        return kind.lengths[cursor], kind.order[cursor]
 
-        # Update the shape of the job piece
-        self.shape[drop_col] = np.zeros((1, self.shape.shape[1]), dtype=int)
-        self.rotated_shape = np.rot90(self.shape)
+    def copy(self) -> "Job":
+        """
+        Get an independent copy of the job, for a forked model.
+        """
+        job = Job.__new__(Job)
+        job.kind = self.kind
+        job.cursor = self.cursor
+        job.curr_time = self.curr_time
+        job.appear_time = self.appear_time
+        return job
 
-        return col_len, drop_col
+
+class GridHistory:
+    """
+    Append-only store of the rows that left the grid, oldest row first.
+    Rows are written into preallocated chunks, so appending does not copy the history.
+    Once the history passes spill_rows rows, it is moved into a memory-mapped file,
+    removed by close or when the history is garbage collected.
+    Forks share the rows (copy on write): filled is shared by all the histories of the same rows and counts
+    the rows written into them, a history only appends in place if nobody wrote past its own length.
+    """
+    WIDTH: int
+    length: int
+    rows: np.ndarray
+    filled: list[int]
+    chunk_rows: int
+    spill_rows: int
+    spill_path: str
+    remover: weakref.finalize
+
+    def __init__(self, width: int, dtype=int, chunk_rows: int = None, spill_rows: int = None, spill_dir: str = None):
+        """
+        chunk_rows, spill_rows and spill_dir default to HISTORY_CHUNK_ROWS, HISTORY_SPILL_ROWS and HISTORY_SPILL_DIR,
+        read when the history is created.
+        """
+        chunk_rows = chunk_rows if chunk_rows is not None else HISTORY_CHUNK_ROWS
+        self.WIDTH = width
+        self.length = 0                                             # Number of rows stored
+        self.chunk_rows = chunk_rows
+        self.spill_rows = spill_rows if spill_rows is not None else HISTORY_SPILL_ROWS     # None to never spill into a file
+        self.spill_dir = spill_dir if spill_dir is not None else HISTORY_SPILL_DIR
+        self.spill_path = None                                      # Path of the memory-mapped file, None while in memory
+        self.remover = None                                         # Removes the spill file when the history is collected
+        self.rows = np.zeros((chunk_rows, width), dtype=dtype)      # Preallocated rows, only the first length rows are used
+        self.filled = [0]                                           # Number of rows written into rows, shared with the forks
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, key):
+        """
+        Index the history newest row first, same as the order of the grid history array.
+        """
+        return self.reversed()[key]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.reversed(), dtype=dtype)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return (self.length, self.WIDTH)
+
+    @property
+    def dtype(self):
+        return self.rows.dtype
+
+    def forward(self) -> np.ndarray:
+        """
+        View of the history, oldest row first (no copy).
+        """
+        return self.rows[:self.length]
+
+    def reversed(self) -> np.ndarray:
+        """
+        View of the history, newest row first (no copy).
+        """
+        return self.rows[:self.length][::-1]
+
+    def append(self, row: np.ndarray):
+        """
+        Append one row to the history.
+        """
+        self.own()
+        self.reserve(self.length + 1)
+        self.rows[self.length] = row
+        self.length += 1
+        self.filled[0] = self.length
+
+    def extend(self, rows: np.ndarray):
+        """
+        Append rows to the history, rows are given oldest first.
+        """
+        self.own()
+        self.reserve(self.length + len(rows))
+        self.rows[self.length:self.length + len(rows)] = rows
+        self.length += len(rows)
+        self.filled[0] = self.length
+
+    def fork(self) -> "GridHistory":
+        """
+        Get a history with the same rows, sharing them until one of the two appends past the other.
+        The spill file stays owned by this history, the fork copies the rows into memory when it has to.
+        """
+        history = GridHistory.__new__(GridHistory)
+        history.__dict__.update(self.__dict__)
+        history.spill_path = None
+        history.remover = None
+        return history
+
+    def __getstate__(self) -> dict:
+        """
+        Pickle and copy with the rows in memory: the copy neither shares nor removes the spill file of this history,
+        it spills into its own file when it passes spill_rows again.
+        """
+        state = self.__dict__.copy()
+        if isinstance(self.rows, np.memmap):
+            state["rows"] = np.array(self.rows[:max(self.length, 1)])
+            state["filled"] = [self.length]
+        state["spill_path"] = None
+        state["remover"] = None
+        return state
+
+    def own(self):
+        """
+        Copy the rows before writing if another fork already wrote past the length of this history.
+        The spill file of this history is removed, the forks still reading it keep their mapping.
+        """
+        if self.filled[0] == self.length:
+            return
+        rows = np.zeros((max(self.rows.shape[0], self.chunk_rows), self.WIDTH), dtype=self.rows.dtype)
+        rows[:self.length] = self.rows[:self.length]
+        self.rows = rows
+        self.filled = [self.length]
+        self.remove_file()
+
+    def reserve(self, num_rows: int):
+        """
+        Make sure the store has room for num_rows rows.
+        The in-memory store doubles its size, the memory-mapped file grows by whole chunks.
+        """
+        capacity = self.rows.shape[0]
+        if num_rows <= capacity:
+            return
+        if self.spill_path is None and self.spill_rows is not None and num_rows > self.spill_rows:
+            self.spill(num_rows)
+            return
+        chunks = -(-num_rows // self.chunk_rows)
+        if self.spill_path is None:
+            capacity = max(2 * capacity, chunks * self.chunk_rows)
+            rows = np.zeros((capacity, self.WIDTH), dtype=self.rows.dtype)
+            rows[:self.length] = self.rows[:self.length]
+            self.rows = rows
+            self.filled = [self.length]
+        else:
+            self.rows = self._map_file(chunks * self.chunk_rows)
+
+    def spill(self, num_rows: int = 0):
+        """
+        Move the history into a memory-mapped file with room for num_rows rows.
+        """
+        if self.spill_path is not None:
+            return
+        fd, self.spill_path = tempfile.mkstemp(prefix="grid_history_", suffix=".dat", dir=self.spill_dir)
+        os.close(fd)
+        self.remover = weakref.finalize(self, remove_spill_file, self.spill_path)
+        chunks = -(-max(num_rows, self.length, 1) // self.chunk_rows)
+        rows = self.rows
+        self.rows = self._map_file(chunks * self.chunk_rows)
+        self.rows[:self.length] = rows[:self.length]
+        self.filled = [self.length]
+
+    def _map_file(self, capacity: int) -> np.ndarray:
+        """
+        Resize the spill file to capacity rows and map it into memory.
+        """
+        if isinstance(self.rows, np.memmap):
+            self.rows.flush()
+        with open(self.spill_path, "r+b") as file:
+            file.truncate(capacity * self.WIDTH * self.rows.dtype.itemsize)
+        return np.memmap(self.spill_path, dtype=self.rows.dtype, mode="r+", shape=(capacity, self.WIDTH))
+
+    def close(self, keep_rows: bool = True):
+        """
+        Release the memory-mapped file, the history is copied back into memory (emptied if keep_rows is False).
+        """
+        if self.spill_path is None:
+            return
+        if keep_rows:
+            self.rows = np.array(self.rows[:max(self.length, 1)])
+        else:
+            self.rows = np.zeros((1, self.WIDTH), dtype=self.rows.dtype)
+            self.length = 0
+        self.filled = [self.length]
+        self.remove_file()
+
+    def remove_file(self):
+        """
+        Remove the spill file of this history, if it has one.
+        """
+        if self.remover is not None:
+            self.remover()
+        self.remover = None
+        self.spill_path = None
+
+
+def remove_spill_file(path: str):
+    """
+    Remove a spill file of a grid history, it may already be gone.
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
 
 
 class ScheduleGrid:
+    """
+    Grid of the schedule, with an incremental hash of its cells:
+    cell_hash is the sum over the cells of zobrist[col, value] * HASH_MULTIPLIER ** logical row (modulo 2 ** 64),
+    so a write only adds the change of its cells and a time shift divides the hash by HASH_MULTIPLIER
+    once the dropped row is taken out. Free cells have the key 0.
+    """
     HEIGHT: int     # Height of the grid, the actual height is HEIGHT - max_setup_time (hidden rows)
     WIDTH: int
-    grid: np.ndarray
+    buffer: np.ndarray
+    offset: int
+    versions: list[int]
+    intervals: list[ColumnIndex]
     curr_top: list[str]
     curr_time: list[int]
+    zobrist: np.ndarray
+    powers: np.ndarray
+    cell_hash: int
     
-    def __init__(self, width: int, height: int):
+    def __init__(self, width: int, height: int, num_ids: int = 2, dtype=int):
         self.HEIGHT = height
         self.WIDTH = width
-        self.grid = np.zeros((self.HEIGHT, self.WIDTH), dtype=int)  # Grid of the schedule
-        self.curr_top = [None] * self.WIDTH                         # Current top of the grid job piece type
-        self.curr_time = [0] * self.WIDTH                           # Current time of the grid of each column
+        self.buffer = np.zeros((2 * self.HEIGHT, self.WIDTH), dtype=dtype) # Circular storage of the grid, every row is stored twice
+        self.offset = 0                                                     # Physical row of the logical row 0 (oldest hidden row)
+        self.versions = [0] * self.WIDTH                                    # Number of writes into each column
+        self.intervals = [ColumnIndex(self.HEIGHT) for _ in range(self.WIDTH)]   # Interval index of each column
+        self.curr_top = [None] * self.WIDTH                                 # Current top of the grid job piece type
+        self.curr_time = [0] * self.WIDTH                                   # Current time of the grid of each column
+
+        # Zobrist key of each (column, grid id) and the power of the multiplier of each logical row, shared by the grids of the same shape
+        self.zobrist, self.powers = hash_tables(self.WIDTH, self.HEIGHT, num_ids)
+        self.cell_hash = 0                                                  # Hash of the cells, relative to the base time
+
+    @property
+    def grid(self) -> np.ndarray:
+        """
+        Logical view of the grid, row 0 is the oldest hidden row.
+        The buffer stores every row twice (at p and p + HEIGHT), so the
+        logical view is always a contiguous slice and no copy is made.
+        The view is read only, use set_cells to write into the grid.
+        """
+        view = self.buffer[self.offset:self.offset + self.HEIGHT]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.buffer.dtype
+
+    def copy(self) -> "ScheduleGrid":
+        """
+        Get an independent copy of the grid and of its interval index.
+        """
+        grid = ScheduleGrid.__new__(ScheduleGrid)
+        grid.HEIGHT = self.HEIGHT
+        grid.WIDTH = self.WIDTH
+        grid.buffer = self.buffer.copy()
+        grid.offset = self.offset
+        grid.versions = self.versions.copy()
+        grid.intervals = [index.copy() for index in self.intervals]
+        grid.curr_top = self.curr_top.copy()
+        grid.curr_time = self.curr_time.copy()
+        grid.zobrist = self.zobrist
+        grid.powers = self.powers
+        grid.cell_hash = self.cell_hash
+        return grid
+
+    def compute_hash(self) -> int:
+        """
+        Hash the cells from scratch, same value as the incremental cell_hash.
+        """
+        keys = self.zobrist[np.arange(self.WIDTH), self.grid]
+        return int((keys * self.powers[:, None]).sum())
+
+    def row(self, y: int) -> np.ndarray:
+        """
+        Get the logical row y of the grid (read only).
+        """
+        return self.grid[y]
+
+    def column(self, col: int) -> np.ndarray:
+        """
+        Get the logical column col of the grid (read only).
+        """
+        return self.grid[:, col]
+
+    def set_cells(self, col: int, height: int, length: int, value: int):
+        """
+        Set length cells of the column col to value, starting from the logical row height.
+        """
+        if length <= 0:
+            return
+        logical_rows = (height + np.arange(length)) % self.HEIGHT
+        rows = (self.offset + logical_rows) % self.HEIGHT
+        keys = self.zobrist[col]
+        change = ((keys[value] - keys[self.buffer[rows, col]]) * self.powers[logical_rows]).sum()
+        self.cell_hash = (self.cell_hash + int(change)) & HASH_MASK
+        self.buffer[rows, col] = value
+        self.buffer[rows + self.HEIGHT, col] = value
+        self.versions[col] += 1
+        index = self.intervals[col]
+        index.assign(index.low + height, index.low + height + length, value)
+
+    def advance(self, steps: int = 1) -> np.ndarray:
+        """
+        Time goes by steps units: every logical row moves down by steps and the top rows are empty.
+        Only the dropped rows are cleared, return a copy of the dropped rows (oldest first),
+        rows that were added and dropped within the steps are empty.
+        """
+        num_rows = min(steps, self.HEIGHT)
+        logical_rows = np.arange(num_rows)
+        rows = (self.offset + logical_rows) % self.HEIGHT
+        dropped = self.buffer[rows]
+        removed = int((self.zobrist[np.arange(self.WIDTH), dropped] * self.powers[logical_rows, None]).sum())
+        self.cell_hash = (self.cell_hash - removed) * pow(HASH_INVERSE, steps, 1 << 64) & HASH_MASK
+        self.buffer[rows] = 0
+        self.buffer[rows + self.HEIGHT] = 0
+        self.offset = (self.offset + steps) % self.HEIGHT
+        for index in self.intervals:
+            index.advance(steps)
+        if steps > num_rows:
+            dropped = np.concatenate([dropped, np.zeros((steps - num_rows, self.WIDTH), dtype=dropped.dtype)])
+        return dropped
+
+
+def hash_tables(width: int, height: int, num_ids: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Get the Zobrist keys (width, num_ids) and the multiplier powers (height) of the grids of this shape.
+    They only depend on the shape and HASH_SEED, so they are built once and shared read only.
+    """
+    key = (width, height, num_ids)
+    tables = _hash_tables.get(key)
+    if tables is None:
+        zobrist = np.random.default_rng(HASH_SEED).integers(0, HASH_MASK, size=(width, num_ids), dtype=np.uint64, endpoint=True)
+        zobrist[:, 0] = 0
+        powers = np.array([pow(HASH_MULTIPLIER, i, 1 << 64) for i in range(height)], dtype=np.uint64)
+        zobrist.setflags(write=False)
+        powers.setflags(write=False)
+        tables = _hash_tables[key] = (zobrist, powers)
+    return tables
+
+
+class ActionEffects:
+    """
+    Effects of every block action of the available actions (same order, without the time action),
+    computed without executing them:
+    the reward of the move (non zero only if it places the last part of its job), the time the part completes,
+    the setup time written around the part and the busy fraction of the visible rows of the drop column after the move.
+    """
+    actions: np.ndarray
+    reward: np.ndarray
+    completion_time: np.ndarray
+    added_setup: np.ndarray
+    column_fill: np.ndarray
+
+    def __init__(self, actions: np.ndarray, reward: np.ndarray, completion_time: np.ndarray, added_setup: np.ndarray, column_fill: np.ndarray):
+        self.actions = actions                      # (n, 2) array of (block, delay)
+        self.reward = reward
+        self.completion_time = completion_time
+        self.added_setup = added_setup
+        self.column_fill = column_fill
+
+    def __len__(self) -> int:
+        return len(self.actions)
 
 
 class ScheduleModel:
-    pending_jobs: deque
+    scenario: Scenario
+    arrivals: PendingJobs
+    online: bool
     job_list: list[Job]
+    num_slots: int
+    ranking: JobRanking
+    window: list[Job]
     num_jobs: int
     base_time: int
     max_time: int
     grid: ScheduleGrid
-    grid_history: np.ndarray
+    grid_history: GridHistory
     game_over: bool
-    available_action: dict[int, dict[int, tuple[int, int, int, int, Job, int]]]
+    available_action: dict[int, dict[int, tuple[int, int, int, int, int]]]
     cached_available_actions: list[tuple[int, int]]
+    action_cache: ActionCache
+    num_delays: int
+    action_mask: np.ndarray
+    verbose: bool
 
-    def __init__(self):
-        initialize_job_data()                                       # Initialize the job data
-        self.pending_jobs = deque()                                 # Data of upcoming job of the schedule
-        with open(JOB_INFO_PATH, encoding='utf-8-sig') as file:
-            for line in csv.reader(file):
-                self.pending_jobs.append(line)
-        file.close()
-        grid_info = self.pending_jobs.popleft()
-        self.pending_jobs.popleft()
+    def __init__(self, scenario: Scenario = None, online: bool = False, num_slots: int = NUM_BLOCKS, ranking: type = None,
+                 history_chunk_rows: int = None, history_spill_rows: int = None, history_spill_dir: str = None, verbose: bool = True):
+        if scenario is None:
+            scenario = default_scenario()
+        if num_slots < 1:
+            raise ValueError(f"Invalid number of slots: {num_slots}")
+        self.scenario = scenario                                    # Shared job data of the schedule
+        self.arrivals = scenario.open_arrivals()                    # Upcoming jobs by release time, open to submit_jobs
+        self.online = online                                        # Keep the game running when no job is left, for submit_jobs
+        self.verbose = verbose                                      # Print the reward when the game ends (kept by the forks)
+        self.num_slots = num_slots                                  # Number of jobs of the job list that can be placed (K)
+        self.ranking = ranking() if ranking is not None else None   # Order of the job window (JobRanking subclass, None for the job list order)
+        self.window = []                                            # Jobs of the slots 1 to K
 
         # Setup the grid
-        self.num_jobs = int(grid_info[1])                           # Number of pieces
-        width = int(grid_info[3])                                   # Width of the grid (M)
-        height = NUM_HEIGHT + max_setup_time                        # Height of the grid (including hidden rows (MAX_SETUP_TIME))
-        self.grid = ScheduleGrid(width, height)
+        self.num_jobs = int(scenario.grid_info[1])                  # Number of pieces
+        width = int(scenario.grid_info[3])                          # Width of the grid (M)
+        height = NUM_HEIGHT + scenario.max_setup_time               # Height of the grid (including hidden rows (MAX_SETUP_TIME))
+        dtype = grid_dtype(scenario.num_types)                      # Type of the cells of the grid and of its history
+        self.grid = ScheduleGrid(width, height, scenario.num_types + 2, dtype)
 
         self.base_time = 0                                              # Current time of the grid
         self.max_time = NUM_HEIGHT                                      # Maximum time of the grid
         self.job_list = []                                              # Current time's job of the grid
-        self.available_action = {1: {}, 2: {}, 3: {}, 4: {}, 5: {}, 6: {}, 7: {}, 8: {}, 9: {}} # Available action for each job
-        self.grid_history = np.ndarray((0, self.grid.WIDTH), dtype=int) # History of the grid
+        self.available_action = self.empty_actions()                    # Available action for each slot
+        self.grid_history = GridHistory(self.grid.WIDTH, dtype, history_chunk_rows, history_spill_rows, history_spill_dir)  # History of the grid
         self.game_over = False
         self.total_reward = 0                                           # Total Reward of the game
         self.step_reward = 0                                            # Reward of the current step
+        self.action_cache = ActionCache()                               # Column profiles and available actions of each job
+        self.num_delays = self.grid.HEIGHT - scenario.max_setup_time    # Number of delays of a block action
+        self.action_mask = np.zeros(self.get_action_space_size(), dtype=bool)  # Available actions by flat index (see encode_action)
 
     def start_game(self):
         """
         Start the game.
         """
         # Add new job to the current job list
-        while self.pending_jobs and self.pending_jobs[0][2] == '0':
-            self.job_list.append(Job(self.pending_jobs.popleft()[1], 0))
+        while self.arrivals.next_release() == 0:
+            job_type, _ = self.arrivals.pop()
+            self.add_job(Job(job_type, 0, self.scenario))
             self.num_jobs -= 1
         
         # Check the status of the game
         self.check_status()
         self.cached_available_actions = self._get_available_actions()
     
-    def end_game(self):
+    def end_game(self, copies: int = 1):
         """
         Check if the game is over.
+        copies is the number of times the current grid is appended to the grid history.
         """
         self.game_over = True
 
-        print("Reward: ", self.total_reward)
+        if self.verbose:
+            print("Reward: ", self.total_reward)
 
         # Append the current grid to the grid history
-        for i in range(self.grid.HEIGHT):
-            self.grid_history = np.insert(self.grid_history, 0, self.grid.grid[i], axis=0)
+        self.grid_history.extend(np.tile(self.grid.grid, (copies, 1)))
     
-    def add_time(self):
+    def close(self):
+        """
+        Remove the spill file of the grid history, when the model is not used anymore.
+        """
+        self.grid_history.close(keep_rows=False)
+
+    def add_time(self, steps: int = 1):
+        """
+        Time goes by steps units (one by default), then the status of the game is checked.
+        """
+        self.advance_time(steps)
+        self.check_status()
+
+    def advance_time(self, steps: int):
         """
-        Time goes by one unit.
-        update the current time of the grid and the current job.
+        Move the time steps units forward in one shift of the grid and of the grid history.
+        update the current time of the grid and add the jobs released on the way, with their release time.
         """
-        self.base_time += 1
-        self.max_time += 1
-        time = str(self.base_time)
+        self.base_time += steps
+        self.max_time += steps
 
         # Add new job to the current job list
-        while self.pending_jobs and self.pending_jobs[0][2] == time and self.num_jobs > 0:
-            self.job_list.append(Job(self.pending_jobs.popleft()[1], int(time)))
+        self.release_jobs()
+
+        # Update the grid by deleting the bottom rows
+        self.remove_bottom(steps)
+        if self.ranking is not None:
+            self.ranking.advance(self)
+
+    def add_job(self, job: Job):
+        """
+        Add a released job to the end of the job list and to the ranking.
+        """
+        self.job_list.append(job)
+        if self.ranking is not None:
+            self.ranking.add(self, job)
+
+    def release_jobs(self) -> int:
+        """
+        Move the pending jobs released at or before the current time into the job list.
+        return the number of jobs released.
+        """
+        released = 0
+        while self.num_jobs > 0:
+            release_time = self.arrivals.next_release()
+            if release_time is None or release_time > self.base_time:
+                break
+            job_type, release_time = self.arrivals.pop()
+            self.add_job(Job(job_type, release_time, self.scenario))
             self.num_jobs -= 1
+            released += 1
+        return released
 
-        # Update the grid by deleting the bottom row  
-        self.remove_bottom()
-        self.check_status()
+    def submit_jobs(self, batch: list[tuple[str, int]]):
+        """
+        Add jobs to the pending queue between moves, batch is a list of (job type, release time).
+        Jobs released at or before the current time join the end of the job list right away.
+        The jobs already in the job list keep their slots and their cached actions, only the new jobs are searched.
+        """
+        if self.game_over:
+            raise RuntimeError("The game is over, create the model with online=True to keep it running")
+        batch = [(job_type, int(release_time)) for job_type, release_time in batch]
+        for job_type, _ in batch:
+            if job_type not in self.scenario.job_data:
+                raise ValueError(f"Unknown job type: {job_type}")
+        for job_type, release_time in batch:
+            self.arrivals.push(job_type, release_time)
+        self.num_jobs += len(batch)
+        if self.release_jobs():
+            self.cached_available_actions = self._get_available_actions()
 
     def check_status(self):
         """
-        Check the status of the game. In the folling cases, the time will add 1:
+        Check the status of the game. In the folling cases, the time goes by:
         1, There are no empty spaces in the bottom line.
         2, There are no job in the current job list.
         3, A block is touching the top of the grid.
         this function handle the 1, 2 cases.
+        Nothing can be placed until the next event, so the time jumps there in one shift:
+        the first row above the bottom with a free cell, or the next release time if the job list is empty.
+        If the job file runs out before the number of jobs of its header, the remaining count is dropped and the game ends.
+        In online mode the game does not end when no job is left, only the time action is available until submit_jobs.
         """
-        # Check if the bottom line is full
-        bottom_full = self.check_bottom_full()
-        while bottom_full:
-            self.add_time()
-            bottom_full = self.check_bottom_full()
-        
-        # Check if the current job list is empty
-        while not self.job_list:
-            if self.num_jobs == 0:
-                self.end_game()
-                break
+        steps = 0
+        while True:
+            if self.check_bottom_full():
+                skip = self.get_free_row_distance()
+            elif not self.job_list and self.num_jobs > 0:
+                if self.arrivals.next_release() is None:
+                    # The job file has fewer jobs than its header counts, no job is left
+                    self.num_jobs = 0
+                    break
+                skip = self.get_release_distance()
             else:
-                self.add_time()
+                break
+            self.advance_time(skip)
+            steps += skip
+
+        if not self.job_list and self.num_jobs == 0 and not self.online:
+            # The time used to go by in nested calls, each ending the game: keep the same grid history
+            self.end_game(steps + 1)
+
+    def get_free_row_distance(self) -> int:
+        """
+        Get the number of time units until the bottom line has a free cell.
+        """
+        full = np.all(self.grid.grid[self.scenario.max_setup_time:] != 0, axis=1)
+        free = np.flatnonzero(~full)
+        return int(free[0]) if len(free) else len(full)
+
+    def get_release_distance(self) -> int:
+        """
+        Get the number of time units until the next job is released (at least 1).
+        """
+        release_time = self.arrivals.next_release()
+        if release_time is None:
+            return 1
+        return max(release_time - self.base_time, 1)
+
+    def fork(self) -> "ScheduleModel":
+        """
+        Get an independent copy of the game, for lookahead.
+        Only the changing state is copied: the grid, the jobs of the job list and their ranking, the arrival cursor and the action mask.
+        The scenario, the cached profiles and actions are shared, and the grid history is copy on write.
+        """
+        model = ScheduleModel.__new__(ScheduleModel)
+        model.__dict__.update(self.__dict__)
+        jobs = {job: job.copy() for job in self.job_list}
+        model.job_list = [jobs[job] for job in self.job_list]
+        model.window = [jobs[job] for job in self.window]
+        if self.ranking is not None:
+            model.ranking = self.ranking.fork(jobs)
+        model.grid = self.grid.copy()
+        model.grid_history = self.grid_history.fork()
+        model.arrivals = self.arrivals.fork()
+        model.available_action = dict(self.available_action)
+        model.action_mask = self.action_mask.copy()
+        model.action_cache = self.action_cache.fork(jobs)
+        return model
+
+    def snapshot(self) -> "ScheduleModel":
+        """
+        Save the state of the game, it can be restored any number of times.
+        """
+        return self.fork()
+
+    def restore(self, snapshot: "ScheduleModel"):
+        """
+        Go back to the state saved by snapshot.
+        """
+        self.__dict__.update(snapshot.fork().__dict__)
+
+    def get_state_hash(self) -> int:
+        """
+        Get a 64-bit key of the state of the game, equal for equal states reached by different moves.
+        The grid part is kept up to date by each write and time shift (see ScheduleGrid),
+        only the jobs of the job list (type, remaining parts, times) and the pending job cursors are folded in here.
+        """
+        key = self.base_time * HASH_MULTIPLIER + self.arrivals.position
+        key = (key * HASH_MULTIPLIER + self.arrivals.sequence) & HASH_MASK
+        for job in self.job_list:
+            key = (key * HASH_MULTIPLIER + job.id) & HASH_MASK
+            key = (key * HASH_MULTIPLIER + job.cursor) & HASH_MASK
+            key = (key * HASH_MULTIPLIER + job.curr_time) & HASH_MASK
+            key = (key * HASH_MULTIPLIER + job.appear_time) & HASH_MASK
+        key ^= key >> 31
+        key = key * HASH_MULTIPLIER & HASH_MASK
+        key ^= key >> 29
+        return key ^ self.grid.cell_hash
 
     def get_action_space_size(self) -> int:
         """
@@ -173,145 +758,216 @@ class ScheduleModel:
         return an int representing the action space size.
         Calculated by:
         Add time: 1
-        Block actions: 9
+        Block actions: K (num_slots)
         Possible delay times: Height of the grid - 1
         """
-        return 1 + 9 + 9 * (self.grid.HEIGHT - max_setup_time - 1)
+        return 1 + self.num_slots + self.num_slots * (self.grid.HEIGHT - self.scenario.max_setup_time - 1)
     
     def get_available_actions(self) -> list[tuple[int, int]]:
         return self.cached_available_actions
 
+    def get_action_mask(self) -> np.ndarray:
+        """
+        Get the mask of the available actions, a bool array of the action space size indexed by flat action.
+        The mask is updated in place by each move, the returned view is read only.
+        """
+        view = self.action_mask.view()
+        view.flags.writeable = False
+        return view
+
+    def encode_action(self, action: tuple[int, int]) -> int:
+        """
+        Get the flat index of the (block, delay) action.
+        """
+        return encode_action(action, self.num_delays, self.num_slots)
+
+    def decode_action(self, index: int) -> tuple[int, int]:
+        """
+        Get the (block, delay) action of the flat index.
+        """
+        return decode_action(index, self.num_delays, self.num_slots)
+
+    def is_available(self, action: tuple[int, int]) -> bool:
+        """
+        Check if the (block, delay) action is available.
+        """
+        try:
+            return bool(self.action_mask[self.encode_action(action)])
+        except ValueError:
+            return False
+
     def _get_available_actions(self) -> list[tuple[int, int]]:
         """
         Get the available actions of the game.
         Must be called before execute_move.
         return a dictionary of int representing the available actions. 
         The key 0 represents the progress action.
-        The key 1 to 9 represents the block actions.
+        The key 1 to K represents the block actions of the jobs of the window.
         the value is a list of int representing the available delay times.
         """
         available_actions = [(0, 0)]
-        job_num = len(self.job_list) if len(self.job_list) < 9 else 9
-        for i in range(0, job_num):
+        self.action_mask[:] = False
+        self.action_mask[0] = True
+        self.window = self.get_window()
+        for i in range(0, len(self.window)):
             actions = self.get_available_delay_actions(i)
             if actions:
                 available_actions.extend(actions)
         return available_actions
 
-    def get_available_delay_actions(self, job_int: int) -> list[tuple[int, int]]:
+    def get_window(self) -> list[Job]:
         """
-        Get the available skip actions of the game with the given job piece.
-        return a list of int representing the available skip actions.
-        """          
-        available_delay = []
-        cur_delay = 0
-        job = self.job_list[job_int]                  # Get the job piece
-        drop_col = job.piece_order[0] - 1
-        drop_len = np.sum(job.shape[drop_col], axis=0)  # Get the drop piece length and the drop column  
-        col_str = "M" + str(drop_col + 1)
-
-        cur_top = 0                               # Get the current job type at the top of the column
-        cur_time = self.base_time                 # Get the current time of the grid
-        cur_setup_time = 0                        # Get the current setup time of the grid
+        Get the jobs of the slots 1 to K: the first K jobs of the ranking, or of the job list without a ranking.
+        """
+        if self.ranking is None:
+            return self.job_list[:self.num_slots]
+        return self.ranking.top(self.num_slots)
+
+    def empty_actions(self) -> dict[int, dict]:
+        return {key: {} for key in range(1, self.num_slots + 1)}
+
+    def evaluate_actions(self) -> ActionEffects:
+        """
+        Get the effects of all the available block actions in one vectorized pass, the game is not changed.
+        Uses the placements behind the available action entries (place row, setup before / after, drop length, slack),
+        and follows the same writes as commit.
+        """
+        hidden_rows = self.scenario.max_setup_time
+        height = self.grid.HEIGHT
+        tables, blocks, drop_lens, drop_cols, last_parts, appear_times = [], [], [], [], [], []
+        for i, job in enumerate(self.window):
+            placements = self.action_cache.get_last_placements(job)
+            if placements is None or len(placements) == 0:
+                continue
+            count = len(placements)
+            tables.append(placements.table)
+            blocks.append(np.full(count, i + 1))
+            drop_lens.append(np.full(count, placements.drop_len))
+            drop_cols.append(np.full(count, job.drop_col))
+            last_parts.append(np.full(count, job.remaining_parts == 1))
+            appear_times.append(np.full(count, job.appear_time))
+        if not tables:
+            empty = np.zeros(0, dtype=int)
+            return ActionEffects(np.zeros((0, 2), dtype=int), empty, empty, empty, np.zeros(0))
+        table = np.concatenate(tables)
+        delay, row, setup_before, setup_after, slack = table.T
+        drop_len = np.concatenate(drop_lens)
+        drop_col = np.concatenate(drop_cols)
+
+        # Rows written by commit: setup before + part, then free slack rows, then setup after
+        part_end = row + setup_before + drop_len
+        slack_end = part_end + slack
+        end = slack_end + setup_after
+        completion_time = self.base_time + part_end - hidden_rows
+        reward = np.where(np.concatenate(last_parts), np.concatenate(appear_times) - (self.base_time + end - hidden_rows), 0)
+
+        # Busy cells of the visible rows of the drop column, before and after the writes
+        busy = np.zeros((height + 1, self.grid.WIDTH), dtype=int)
+        np.cumsum(self.grid.grid != 0, axis=0, out=busy[1:])
+        row, part_end, slack_end, end = (np.clip(i, hidden_rows, height) for i in (row, part_end, slack_end, end))
+        fill = (busy[height, drop_col] - busy[hidden_rows, drop_col]
+                - (busy[end, drop_col] - busy[row, drop_col]) + (part_end - row) + (end - slack_end))
+        column_fill = fill / (height - hidden_rows)
 
+        actions = np.stack([np.concatenate(blocks), delay], axis=1)
+        return ActionEffects(actions, reward, completion_time, setup_before + setup_after, column_fill)
+
+    def get_column_profile(self, col: int) -> ColumnProfile:
+        """
+        Get the run-length encoding of the logical column col of the grid.
+        The profile is only rebuilt from the interval index when the column was written since it was cached,
+        a time shift only rebases the cached profile.
+        """
+        col %= self.grid.WIDTH
+        version = self.grid.versions[col]
+        profile = self.action_cache.get_profile(col, version, self.base_time)
+        if profile is None:
+            profile = self.grid.intervals[col].profile()
+            self.action_cache.store_profile(col, version, self.base_time, profile)
+        return profile
+
+    def get_gaps(self, col: int, time: int, min_length: int = 1) -> list[tuple[int, int, str, str]]:
+        """
+        Get the gaps (runs of idle or setup time) of the column col
+        of at least min_length time units, from the given time on.
+        return a list of (start time, length, job type below, job type above),
+        the job type is None when the gap reaches the edge of the grid or an idle row.
+        The short gaps are skipped by the interval index (see ColumnIndex), without touching the dense grid.
+        """
+        index = self.grid.intervals[col]
+        offset = index.low - self.base_time + self.scenario.max_setup_time     # Grid row of the time 0
+        job_id = self.scenario.job_id
+        return [
+            (start - offset, length, job_id.get(below), job_id.get(above))
+            for start, length, below, above in index.gaps(time + offset, min_length)
+        ]
+
+    def get_setup_vectors(self, col: int, job_type: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the setup times of the column col indexed by grid id:
+        from each job type to job_type, and from job_type to each job type.
+        Grid ids 0 (free) and 1 (setup) have no setup time.
+        """
+        type_id = self.scenario.job_data[job_type][2]
+        col_setup = self.scenario.setup_tensor[col % self.scenario.num_cols]
+        return col_setup[:, type_id], col_setup[type_id]
+
+    def get_placements(self, job: Job) -> Placements:
+        """
+        Get all the feasible placements of the next part of the job.
+        """
+        drop_col = job.drop_col
+        drop_len = job.drop_len
+        profile = self.get_column_profile(drop_col)
+        setup_from, setup_to = self.get_setup_vectors(drop_col, job.job_type)
+        hidden_rows = self.scenario.max_setup_time
         if job.curr_time > self.base_time:
-            available_space = 0
-            # check the row below the job time to get to top job type
-            for y in range(job.curr_time - 1 - self.base_time + max_setup_time, -1, -1):
-                # if y == 0:
-                #     break
-                available_space += 1
-                if (self.grid.grid[y][drop_col] != 0) and (self.grid.grid[y][drop_col] != 1):
-                    cur_top = self.grid.grid[y][drop_col]
-                    break
-            if cur_top != 0:
-                cur_top = job_id[cur_top]
+            start_row = job.curr_time - self.base_time + hidden_rows
+        else:
+            start_row = hidden_rows
+        row_limit = self.max_time + 2 * hidden_rows
+        return enumerate_placements(profile, drop_len, start_row, job.curr_time > self.base_time, setup_from, setup_to, row_limit)
 
-                # Get the setup time 
-                cur_setup_time = setup_rules[col_str][cur_top][job.job_type]
+    def get_available_delay_actions(self, job_int: int) -> list[tuple[int, int]]:
+        """
+        Get the available skip actions of the game with the job piece of the slot job_int + 1.
+        return a list of int representing the available skip actions.
+        The actions are cached for each job, and only searched again when the job dropped a part,
+        its drop column was written or the time went by.
+        """
+        job = self.window[job_int]                    # Get the job piece
+        key = job_int + 1
+        drop_col = job.drop_col
+        state = (drop_col, job.cursor, job.curr_time, self.grid.versions[drop_col], self.base_time)
+        cached = self.action_cache.get_actions(job, state, key)
+        if cached is None:
+            placements = self.action_cache.get_placements(job, state)
+            if placements is None:
+                placements = self.get_placements(job)
 
-            if cur_setup_time - available_space > 0:
-                cur_time = job.curr_time - cur_setup_time + available_space
-            else:
-                cur_time = job.curr_time - cur_setup_time
-                
-        else: 
-            # Get the current job type at the top of the column
-            cur_top = 0
-            available_space = 0
-            count = max_setup_time - 1
-
-            # Get the available setup space in the hidden rows
-            for i in range(count, -1, -1):
-                cur_block = self.grid.grid[i][drop_col]
-                if cur_block != 0 and cur_block != 1:
-                    cur_top = cur_block
-                    break
-                available_space += 1
-            
-            # Get the setup time
-            if cur_top != 0:
-                cur_top = job_id[cur_top]
-                col_str = "M" + str(drop_col + 1) 
-                cur_setup_time = setup_rules[col_str][cur_top][job.job_type]
-
-                if cur_setup_time - available_space > 0:
-                    cur_time = cur_time - cur_setup_time + available_space
-                else:
-                    cur_time = cur_time - cur_setup_time
-                
-        # Calculate the available delay
-        self.available_action[job_int + 1] = {}  # Reset the available action
-        total_space = drop_len + cur_setup_time
-        while cur_time + cur_setup_time + drop_len < self.max_time + self.base_time + max_setup_time:
-            available_space = 0
-            next_setup_time = 0
-            next_job_len = 0
-            next_job = '0'
-            for l in range(cur_time - self.base_time + max_setup_time, self.max_time + max_setup_time - self.base_time):
-                if next_job != '0':
-                    if self.grid.grid[l][drop_col] == 0:
-                        break
-                    next_job_len += 1
-                else:
-                    if self.grid.grid[l][drop_col] == 0 or self.grid.grid[l][drop_col] == 1:
-                        available_space += 1
-                    else:
-                        next_job = str(self.grid.grid[l][drop_col])
-                        next_job_len += 1
-                    
-            if next_job != '0':
-                next_setup_time = setup_rules[col_str][job.job_type][job_id[int(next_job)]]
-                check_delay = available_space - (cur_setup_time + drop_len + next_setup_time)
-                if check_delay >= 0:
-                    for i in range(check_delay + 1):
-                        available_delay.append((job_int + 1, cur_delay))
-                        self.available_action[job_int + 1][cur_delay] = (cur_time - self.base_time + max_setup_time, cur_setup_time, drop_len, next_setup_time, job, check_delay-i)
-                        cur_delay += 1
-                        cur_time += 1
-                    cur_delay += next_job_len
-                cur_setup_time = setup_rules[col_str][job_id[int(next_job)]][job.job_type]
-            else:
-                next_setup_time = 0
-                check_delay = available_space - (cur_setup_time + drop_len + next_setup_time)
-                if check_delay >= 0:
-                    for i in range(check_delay + 1):
-                        available_delay.append((job_int + 1, cur_delay))
-                        self.available_action[job_int + 1][cur_delay] = (cur_time - self.base_time + max_setup_time, cur_setup_time, drop_len, next_setup_time, job, 0)
-                        cur_delay += 1
-                        cur_time += 1
-                    cur_delay += next_job_len
-                break
-            cur_time += next_job_len
-            
-        return available_delay
+            # Store the placements as the available action of the job
+            drop_len = placements.drop_len
+            entries = {
+                delay: (row, setup_before, drop_len, setup_after, slack)
+                for delay, row, setup_before, setup_after, slack in placements.table.tolist()
+            }
+            delays = np.fromiter(entries, dtype=np.int64, count=len(entries))
+            indices = 1 + job_int * self.num_delays + delays[delays < self.num_delays]
+            cached = (entries, [(key, delay) for delay in entries], indices)
+            self.action_cache.store(job, state, key, placements, *cached)
+        self.available_action[key] = cached[0]
+        self.action_mask[cached[2]] = True
+        return cached[1]
     
     def execute_move(self, action: tuple[int, int]):
         """
         Execute the move of the game.
         (0, 0) represents the progress action.
-        (1, x) to (9, x) represents the block actions, x represents the delay time.
+        (1, x) to (K, x) represents the block actions of the slots of the window, x represents the delay time.
+        The action can also be given as its flat index (see encode_action).
         """
+        if isinstance(action, (int, np.integer)):
+            action = self.decode_action(int(action))
         self.step_reward = 0
         if action == (0, 0):
             self.add_time()
@@ -331,179 +987,149 @@ class ScheduleModel:
         first_setup_time = adding[1]                             # Get the first setup time of the job piece
         drop_len = adding[2]                                     # Get the drop length of the job piece
         next_setup_time = adding[3]                              # Get the next setup time of the job piece
-        job = adding[4]                                          # Get the job piece model
-        to_top = adding[5]                                       # Get the distance to the top of the grid
+        to_top = adding[4]                                       # Get the distance to the top of the grid
+        job = self.window[block_num]                             # Get the job piece model
         col_len, drop_col = job.drop_block()
 
         if first_setup_time > 0:
             self.add_setup_time(first_setup_time, drop_col, place_height)
         place_height += first_setup_time
-        for i in range(drop_len):
-            self.grid.grid[place_height + i][drop_col] = job.id
+        self.grid.set_cells(drop_col, place_height, drop_len, job.id)
         place_height += drop_len
-        job.curr_time = self.base_time + place_height - max_setup_time
+        job.curr_time = self.base_time + place_height - self.scenario.max_setup_time
         if to_top > 0:
-            for i in range(to_top):
-                self.grid.grid[place_height + i][drop_col] = 0
+            self.grid.set_cells(drop_col, place_height, to_top, 0)
             place_height += to_top
         if next_setup_time > 0:
             self.add_setup_time(next_setup_time, drop_col, place_height)
         place_height += next_setup_time
 
-        if not job.piece_order:
+        if job.remaining_parts == 0:
             self.calculate_reward(job.appear_time, place_height)
-            self.job_list.pop(block_num)
+            self.action_cache.discard(job)
+            if self.ranking is None:
+                self.job_list.pop(block_num)
+            else:
+                self.job_list.remove(job)
+                self.ranking.remove(job)
+        elif self.ranking is not None:
+            self.ranking.update(self, job)
+        if self.ranking is not None:
+            self.ranking.written(self, drop_col)
         
-        self.available_action = {1: {}, 2: {}, 3: {}, 4: {}, 5: {}, 6: {}, 7: {}, 8: {}, 9: {}}
+        self.available_action = self.empty_actions()
         self.check_status()
     
     def calculate_reward(self, job_start_time: int, place_height: int):
         """
         Calculate the reward of the finished job
         """
-        self.step_reward = job_start_time - (place_height - max_setup_time + self.base_time)
+        self.step_reward = job_start_time - (place_height - self.scenario.max_setup_time + self.base_time)
         self.total_reward += self.step_reward
   
     def add_setup_time(self, setup_time: int, col: int, height: int):
         """
         Add the setup time to the grid.
         """
-        for i in range(setup_time):
-            self.grid.grid[height + i][col] = 1
+        self.grid.set_cells(col, height, setup_time, 1)
     
     def update_grid(self, col: int, height: int, job: Job, drop_len: int):
         """
         Update the grid by adding the job piece to the grid.
         """
-        for i in range(drop_len):
-            self.grid.grid[height + i][col] = job.id
+        self.grid.set_cells(col, height, drop_len, job.id)
         self.grid.curr_top[col] = job.job_type
     
     def check_bottom_full(self):
         """
         Check if the bottom line is full.
         """
-        for i in self.grid.grid[max_setup_time]:
-            if i == 0:
-                return False
-        return True       
+        return bool(np.all(self.grid.row(self.scenario.max_setup_time)))
 
-    def remove_bottom(self):
+    def remove_bottom(self, steps: int = 1):
         """
-        Remove the bottom row of the grid, store the row into the hidden row,
-        check the hidden row is full or not, if so, store the hidden row into the grid history.
+        Remove the bottom rows of the grid, store the rows into the hidden rows,
+        and store the dropped hidden rows into the grid history.
         """
-        # Pop the bottom row, and all the rows above it move down one row, and the top row is all 0
-        bottom = self.grid.grid[max_setup_time]       
-        self.grid.grid = np.delete(self.grid.grid, max_setup_time, axis=0)       
-        self.grid.grid = np.insert(self.grid.grid, self.grid.HEIGHT - 1, np.zeros(self.grid.WIDTH), axis=0)
+        # All the rows move down steps rows and the top rows are all 0,
+        # the bottom rows move into the hidden rows and the oldest hidden rows are dropped
+        hidden_bottom = self.grid.advance(steps)
 
-        # Store the bottom row into the hidden row
-        hidden_bottom = self.grid.grid[0]
-        self.grid.grid = np.delete(self.grid.grid, 0, axis=0)
-        self.grid.grid = np.insert(self.grid.grid, max_setup_time - 1, bottom, axis=0)
-
-        # Append the hidden row into the grid history
-        self.grid_history = np.insert(self.grid_history, 0, hidden_bottom, axis=0)
+        # Append the hidden rows into the grid history
+        self.grid_history.extend(hidden_bottom)
         
 # ========================================================================================================
-# Initialize function below
+# Action codec below
 # ========================================================================================================
-def initialize_job_data():
-    global job_data, num_types, num_cols, max_setup_time, setup_rules, job_id, max_job_height
+def encode_action(action: tuple[int, int], num_delays: int, num_slots: int = NUM_BLOCKS) -> int:
+    """
+    Get the flat index of the (block, delay) action:
+    0 for the progress action (0, 0), 1 + (block - 1) * num_delays + delay for a block action.
+    """
+    block, delay = action
+    if block == 0 and delay == 0:
+        return 0
+    if not (1 <= block <= num_slots and 0 <= delay < num_delays):
+        raise ValueError(f"Invalid action: {action}")
+    return 1 + (block - 1) * num_delays + delay
 
-    job_data, piece_info, job_id, max_job_height = handle_type_info_file(JOB_TYPE_PATH)                                                                    
+def decode_action(index: int, num_delays: int, num_slots: int = NUM_BLOCKS) -> tuple[int, int]:
+    """
+    Get the (block, delay) action of the flat index (inverse of encode_action).
+    """
+    if index == 0:
+        return (0, 0)
+    if not 0 < index <= num_slots * num_delays:
+        raise ValueError(f"Invalid action index: {index}")
+    block, delay = divmod(index - 1, num_delays)
+    return (block + 1, delay)
 
-    setup_rules, max_setup_time = handle_setup_file(SETUP_PATH, list(job_data.keys()))
+def encode_actions(actions: np.ndarray, num_delays: int) -> np.ndarray:
+    """
+    Get the flat indices of an (n, 2) array of (block, delay) actions.
+    """
+    actions = np.asarray(actions, dtype=np.int64).reshape(-1, 2)
+    return np.where(actions[:, 0] == 0, 0, 1 + (actions[:, 0] - 1) * num_delays + actions[:, 1])
 
-    num_types = int(piece_info[0][1])  # Number of types of job
-    num_cols = int(piece_info[0][3])   # Number of columns
+def decode_actions(indices: np.ndarray, num_delays: int) -> np.ndarray:
+    """
+    Get the (n, 2) array of (block, delay) actions of flat indices.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    block, delay = np.divmod(indices - 1, num_delays)
+    return np.stack([np.where(indices == 0, 0, block + 1), np.where(indices == 0, 0, delay)], axis=-1)
 
-def handle_type_info_file(type_info_file: str):
+# ========================================================================================================
+# Initialize function below
+# ========================================================================================================
+def default_scenario() -> Scenario:
     """
-    Handle the type info file and 
-    return the job model and the piece info.
+    Get the scenario of the files set by the constants on the top of this file.
     """
-    max_job_height = 0
-    id_dict = {}
-    cur_id = 2
-    piece_info = []
-    i = 0
-    with open(type_info_file, encoding='utf-8-sig') as file:
-        data = {}
-        for line in csv.reader(file):
-            if i < 2:
-                piece_info.append(line)
-                i += 1
-            else:
-                if line[0] != '':
-                    key = line[0]
-                    order = line[1].split(",")
-                    cur_data = line[2:]
-                    order, shape, height = get_job_model(cur_data, order)
-                    if height > max_job_height:
-                        max_job_height = height
-                    data[key] = [order, shape, cur_id]
-                    id_dict[cur_id] = key
-                    cur_id += 1
-    file.close()
-    return data, piece_info, id_dict, max_job_height
-
-def handle_setup_file(setup_file: str, job_list: list):
+    return load_scenario(JOB_TYPE_PATH, SETUP_PATH, JOB_INFO_PATH)
+
+def grid_dtype(num_types: int) -> np.dtype:
     """
-    Handle the setup file
+    Get the type of the grid cells of a scenario with num_types job types (see GRID_DTYPE):
+    the grid ids are 0 (free), 1 (setup) and 2 to num_types + 1 (job types), so uint8 up to 254 job types.
     """
-    max_time = 0 # max time for a setup
-    setup_rule = {}
-    num_col = 0
-    num_job = 0
-    cur_col = [0, None]
-    cur_job = 0
-    first_line = True
-    with open(setup_file, encoding='utf-8-sig') as file:
-        for line in csv.reader(file):
-            if first_line:
-                first_line = False
-                num_col = int(line[1])
-                num_job = int(line[3])
-            else:
-                if cur_col[0] > num_col:
-                    break
-                if cur_job == 0:
-                    cur_col[1] = line[0]
-                    setup_rule[line[0]] = {}
-                    for i in job_list:
-                        setup_rule[line[0]][i] = {}
-                        for j in job_list:
-                            setup_rule[line[0]][i][j] = 0
-                    cur_job += 1
-                else:
-                    job_name = line[0]
-                    for i in range(1, len(line)):
-                        setup_rule[cur_col[1]][job_name][job_list[i - 1]] = int(line[i])
-                        if int(line[i]) > max_time:
-                            max_time = int(line[i])
-                    cur_job += 1
-                    if cur_job > num_job:
-                        cur_job = 0
-                        cur_col[0] += 1
-    file.close()
-    return setup_rule, max_time
-
-def get_job_model(lst: list, order: list):
+    if GRID_DTYPE is not None:
+        return np.dtype(GRID_DTYPE)
+    return np.min_scalar_type(num_types + 1)
+
+def initialize_job_data() -> Scenario:
     """
-    Get the job nparray model from the list of job info.
+    Set the module level job data from the default scenario, kept for older scripts.
     """
-    pointer = 0
-    int_order = deque()
-    col = sum([int(i) for i in lst])
-    shape = np.zeros((len(lst), col), dtype=int)
-    for i in order:
-        i = int(i)
-        int_order.append(i)
-        cur_row = shape[i - 1]
-        cur_len = int(lst[i - 1])
-        for j in range(cur_len):
-            cur_row[pointer + j] = 1
-        pointer += cur_len
-    return int_order, shape, col
+    global job_data, num_types, num_cols, max_setup_time, setup_rules, setup_tensor, job_id, max_job_height
+
+    scenario = default_scenario()
+    job_data = scenario.job_data
+    job_id = scenario.job_id
+    max_job_height = scenario.max_job_height
+    setup_rules = scenario.setup_rules
+    setup_tensor = scenario.setup_tensor
+    max_setup_time = scenario.max_setup_time
+    num_types = scenario.num_types      # Number of types of job
+    num_cols = scenario.num_cols        # Number of columns
+    return scenario
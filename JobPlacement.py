@@ -0,0 +1,539 @@
+import numpy as np
+from bisect import bisect_left, bisect_right
+
+FREE = 0        # Grid value of an idle cell
+SETUP = 1       # Grid value of a setup cell
+
+
+class ColumnProfile:
+    """
+    Run-length encoding of one logical column of the grid.
+    The column is split once into free, setup and job segments,
+    the placement search then jumps from segment to segment instead of scanning cells.
+    """
+    HEIGHT: int
+    starts: list[int]
+    ends: list[int]
+    values: list[int]
+    next_job: list[int]
+    next_free: list[int]
+    prev_job: list[int]
+
+    def __init__(self, starts: list[int], ends: list[int], values: list[int], height: int):
+        self.HEIGHT = height
+        self.starts = starts                # Logical row of the first cell of each segment
+        self.ends = ends                    # Logical row after the last cell of each segment
+        self.values = values                # Grid value of each segment (0 free, 1 setup, >= 2 job id)
+
+        # Per segment: first job / free segment at or after it, last job segment at or before it
+        num_segments = len(starts)
+        self.next_job = [num_segments] * (num_segments + 1)
+        self.next_free = [num_segments] * (num_segments + 1)
+        self.prev_job = [-1] * num_segments
+        for i in range(num_segments - 1, -1, -1):
+            self.next_job[i] = i if values[i] > SETUP else self.next_job[i + 1]
+            self.next_free[i] = i if values[i] == FREE else self.next_free[i + 1]
+        last_job = -1
+        for i in range(num_segments):
+            if values[i] > SETUP:
+                last_job = i
+            self.prev_job[i] = last_job
+
+    @classmethod
+    def from_column(cls, column: np.ndarray) -> "ColumnProfile":
+        """
+        Run-length encode a logical column of the grid.
+        """
+        height = len(column)
+        if height == 0:
+            return cls([], [], [], 0)
+        starts = np.flatnonzero(np.diff(column)) + 1
+        values = [int(column[0])] + np.asarray(column)[starts].tolist()
+        starts = starts.tolist()
+        return cls([0] + starts, starts + [height], values, height)
+
+    def shifted(self, steps: int) -> "ColumnProfile":
+        """
+        Rebase the profile after the time went by steps units:
+        the bottom rows are dropped, every segment moves down and free rows are added on top.
+        """
+        height = self.HEIGHT
+        starts, ends, values = [], [], []
+        for start, end, value in zip(self.starts, self.ends, self.values):
+            if end - steps > 0:
+                starts.append(max(start - steps, 0))
+                ends.append(end - steps)
+                values.append(value)
+        if values and values[-1] == FREE:
+            ends[-1] = height
+        elif height > 0:
+            starts.append(max(height - steps, 0))
+            ends.append(height)
+            values.append(FREE)
+        return ColumnProfile(starts, ends, values, height)
+
+    def segment(self, row: int) -> int:
+        """
+        Get the index of the segment holding the logical row.
+        """
+        return bisect_right(self.starts, row) - 1
+
+    def value(self, row: int) -> int:
+        """
+        Get the grid value of the logical row.
+        """
+        return self.values[self.segment(row)]
+
+    def next_job_row(self, row: int) -> int:
+        """
+        Get the first job cell at or after the logical row (HEIGHT if none).
+        """
+        if row >= self.HEIGHT:
+            return self.HEIGHT
+        i = self.next_job[self.segment(row)]
+        if i == len(self.starts):
+            return self.HEIGHT
+        return max(row, self.starts[i])
+
+    def next_free_row(self, row: int) -> int:
+        """
+        Get the first free cell at or after the logical row (HEIGHT if none).
+        """
+        if row >= self.HEIGHT:
+            return self.HEIGHT
+        i = self.next_free[self.segment(row)]
+        if i == len(self.starts):
+            return self.HEIGHT
+        return max(row, self.starts[i])
+
+    def prev_job_row(self, row: int) -> int:
+        """
+        Get the last job cell at or before the logical row (-1 if none).
+        """
+        if row < 0:
+            return -1
+        i = self.prev_job[self.segment(row)]
+        if i < 0:
+            return -1
+        return min(row, self.ends[i] - 1)
+
+
+class ColumnIndex:
+    """
+    Sorted interval index of one machine column, kept up to date with the grid.
+    The column is stored as runs of equal cells in grid rows (logical row + number of time shifts),
+    so a time shift only trims the bottom run and grows the top one.
+    Gaps are the maximal runs without a job (idle or setup cells), they are the space the placement search sees.
+    The gaps are kept sorted with the runs, and the lengths of the inner gaps are kept in a max segment tree by
+    start slot (grid row % HEIGHT, the rows of the column cover every slot once), so a gap query skips the short gaps.
+    The bottom gap (starting at low) and the top gap (ending at the top of the column) are left out of the tree,
+    they are the ones a time shift trims and grows, so a time shift only changes the tree when a gap leaves the column.
+    Costs, with r the number of runs of the column and H its height: a write is O(log r) to find its runs plus
+    the list splices and O(log H) per inner gap it changes, a time shift trims the bottom runs and gaps,
+    a gap query is O(log r + (1 + m) log H) for m gaps returned.
+    """
+    HEIGHT: int
+    low: int
+    starts: list[int]
+    ends: list[int]
+    values: list[int]
+    gap_starts: list[int]
+    gap_ends: list[int]
+    num_leaves: int
+    longest: list[int]
+
+    def __init__(self, height: int):
+        self.HEIGHT = height
+        self.low = 0                                        # Grid row of the logical row 0
+        self.starts = [0] if height > 0 else []             # Grid row of the first cell of each run
+        self.ends = [height] if height > 0 else []          # Grid row after the last cell of each run
+        self.values = [FREE] if height > 0 else []          # Grid value of each run
+        self.gap_starts = [0] if height > 0 else []         # Grid row of the first cell of each gap
+        self.gap_ends = [height] if height > 0 else []      # Grid row after the last cell of each gap
+        self.num_leaves = 1 << max(height - 1, 0).bit_length()      # Leaves of the segment tree, one per start slot
+        self.longest = [0] * (2 * self.num_leaves)          # Segment tree: longest inner gap starting in the slots of each node
+
+    def assign(self, start: int, end: int, value: int):
+        """
+        Set the grid rows [start, end) of the column to value.
+        """
+        start = max(start, self.low)
+        end = min(end, self.low + self.HEIGHT)
+        if start >= end:
+            return
+        first = bisect_right(self.starts, start) - 1
+        last = bisect_right(self.starts, end - 1) - 1
+        starts, ends, values = [], [], []
+        if self.starts[first] < start:
+            starts.append(self.starts[first]); ends.append(start); values.append(self.values[first])
+        starts.append(start); ends.append(end); values.append(value)
+        if self.ends[last] > end:
+            starts.append(end); ends.append(self.ends[last]); values.append(self.values[last])
+
+        # Merge with the neighbouring runs of the same value
+        if first > 0 and self.values[first - 1] == values[0]:
+            first -= 1
+            starts[0] = self.starts[first]
+        if last + 1 < len(self.starts) and self.values[last + 1] == values[-1]:
+            last += 1
+            ends[-1] = self.ends[last]
+        for i in range(len(values) - 1, 0, -1):
+            if values[i] == values[i - 1]:
+                ends[i - 1] = ends[i]
+                del starts[i], ends[i], values[i]
+        self.starts[first:last + 1] = starts
+        self.ends[first:last + 1] = ends
+        self.values[first:last + 1] = values
+
+        # Gaps touching the written rows: they are split or merged, find them again from the runs.
+        # Outside of [low_row, high_row) the rows next to the span are job cells (or the edge), so no other gap changes.
+        top = self.low + self.HEIGHT
+        first = bisect_left(self.gap_ends, start)
+        last = bisect_right(self.gap_starts, end)
+        low_row = min(start, self.gap_starts[first]) if first < last else start
+        high_row = max(end, self.gap_ends[last - 1]) if first < last else end
+        gap_starts, gap_ends = [], []
+        i = bisect_right(self.starts, low_row) - 1
+        while i < len(self.starts) and self.starts[i] < high_row:
+            if self.values[i] <= SETUP:
+                run_start = max(self.starts[i], low_row)
+                run_end = min(self.ends[i], high_row)
+                if gap_ends and gap_ends[-1] == run_start:
+                    gap_ends[-1] = run_end
+                else:
+                    gap_starts.append(run_start)
+                    gap_ends.append(run_end)
+            i += 1
+        old_gaps = {i: j for i, j in zip(self.gap_starts[first:last], self.gap_ends[first:last]) if i != self.low and j != top}
+        self.gap_starts[first:last] = gap_starts
+        self.gap_ends[first:last] = gap_ends
+        for gap_start, gap_end in zip(gap_starts, gap_ends):
+            if gap_start != self.low and gap_end != top and old_gaps.pop(gap_start, None) != gap_end:
+                self._set_gap(gap_start, gap_end - gap_start)
+        for gap_start in old_gaps:
+            self._set_gap(gap_start, 0)
+
+    def copy(self) -> "ColumnIndex":
+        """
+        Get an independent copy of the index.
+        """
+        index = ColumnIndex.__new__(ColumnIndex)
+        index.HEIGHT = self.HEIGHT
+        index.low = self.low
+        index.starts = self.starts.copy()
+        index.ends = self.ends.copy()
+        index.values = self.values.copy()
+        index.gap_starts = self.gap_starts.copy()
+        index.gap_ends = self.gap_ends.copy()
+        index.num_leaves = self.num_leaves
+        index.longest = self.longest.copy()
+        return index
+
+    def advance(self, steps: int = 1):
+        """
+        Time goes by steps units: the bottom rows leave the column and idle rows are added on top.
+        """
+        if self.HEIGHT == 0:
+            return
+        old_low = self.low
+        old_top = self.low + self.HEIGHT
+        self.low += steps
+        top = self.low + self.HEIGHT
+        dropped = bisect_right(self.ends, self.low)        # Runs that left the column
+        del self.starts[:dropped], self.ends[:dropped], self.values[:dropped]
+        if self.starts:
+            self.starts[0] = self.low
+        if self.values and self.values[-1] == FREE:
+            self.ends[-1] = top
+        else:
+            self.starts.append(self.ends[-1] if self.ends else self.low)
+            self.ends.append(top)
+            self.values.append(FREE)
+
+        # Gaps: drop the ones that left, the first one left becomes the bottom gap, grow or add the top one
+        gap_starts, gap_ends = self.gap_starts, self.gap_ends
+        dropped = bisect_right(gap_ends, self.low)
+        if dropped:
+            for gap_start, gap_end in zip(gap_starts[:dropped], gap_ends[:dropped]):
+                if gap_start != old_low and gap_end != old_top:
+                    self._set_gap(gap_start, 0)
+            del gap_starts[:dropped], gap_ends[:dropped]
+        if gap_starts and gap_starts[0] <= self.low:
+            if gap_starts[0] != old_low and gap_ends[0] != old_top:
+                self._set_gap(gap_starts[0], 0)
+            gap_starts[0] = self.low
+        if gap_ends and gap_ends[-1] == old_top:
+            gap_ends[-1] = top
+        else:
+            gap_starts.append(max(old_top, self.low))
+            gap_ends.append(top)
+
+    def value(self, row: int) -> int:
+        """
+        Get the grid value at the grid row.
+        """
+        return self.values[bisect_right(self.starts, row) - 1]
+
+    def profile(self) -> ColumnProfile:
+        """
+        Get the profile of the column in logical rows.
+        """
+        low = self.low
+        return ColumnProfile([i - low for i in self.starts], [i - low for i in self.ends], list(self.values), self.HEIGHT)
+
+    def gaps(self, row: int, min_length: int = 1) -> list[tuple[int, int, int, int]]:
+        """
+        Get all the gaps of at least min_length rows starting at or after the grid row,
+        a gap holding the row counts from the row.
+        return a list of (gap start, gap length, value below, value above),
+        the value below / above is the job id next to the gap (0 at the edge of the column).
+        """
+        top = self.low + self.HEIGHT
+        row = max(row, self.low)
+        gaps = []
+        i = bisect_left(self.gap_ends, row + 1)
+        if i == len(self.gap_starts):
+            return gaps
+        if self.gap_starts[i] <= row:
+            # Gap holding the row, or bottom gap
+            if self.gap_ends[i] - row >= min_length:
+                gaps.append(self._gap(row, self.gap_ends[i]))
+            row = self.gap_ends[i]
+
+        # Inner gaps starting in [row, top), found in the segment tree: the slots of the rows wrap around once at most
+        min_length = max(min_length, 1)
+        slot = row % self.HEIGHT if row < top else 0
+        ranges = [(row, slot, min(slot + top - row, self.HEIGHT))]
+        if slot + top - row > self.HEIGHT:
+            ranges.append((row + self.HEIGHT - slot, 0, slot + top - row - self.HEIGHT))
+        for first_row, first_slot, end_slot in ranges:
+            found = self._next_gap(first_slot, end_slot, min_length)
+            while found >= 0:
+                start = first_row + found - first_slot
+                gaps.append(self._gap(start, start + self.longest[self.num_leaves + found]))
+                found = self._next_gap(found + 1, end_slot, min_length)
+        if self.gap_ends[-1] == top and self.gap_starts[-1] >= row and top - self.gap_starts[-1] >= min_length:
+            gaps.append(self._gap(self.gap_starts[-1], top))
+        return gaps
+
+    def _gap(self, start: int, end: int) -> tuple[int, int, int, int]:
+        below = self.value(start - 1) if start > self.low else FREE
+        above = self.value(end) if end < self.low + self.HEIGHT else FREE
+        return (start, end - start, below if below > SETUP else FREE, above)
+
+    def _set_gap(self, start: int, length: int):
+        """
+        Set the length of the gap starting at the grid row start in the segment tree (0 to remove it).
+        """
+        longest = self.longest
+        node = self.num_leaves + start % self.HEIGHT
+        longest[node] = length
+        while node > 1:
+            value = max(longest[node], longest[node ^ 1])
+            node >>= 1
+            if longest[node] == value:
+                break
+            longest[node] = value
+
+    def _next_gap(self, first: int, end: int, min_length: int, node: int = 1, node_first: int = 0, node_end: int = None) -> int:
+        """
+        Get the first slot in [first, end) where a gap of at least min_length rows starts (-1 if none).
+        """
+        if node_end is None:
+            node_end = self.num_leaves
+        if node_end <= first or end <= node_first or self.longest[node] < min_length:
+            return -1
+        if node_end - node_first == 1:
+            return node_first
+        middle = (node_first + node_end) // 2
+        found = self._next_gap(first, end, min_length, 2 * node, node_first, middle)
+        if found < 0:
+            found = self._next_gap(first, end, min_length, 2 * node + 1, middle, node_end)
+        return found
+
+
+class Placements:
+    """
+    All the feasible placements of one drop part in one column.
+    Each row of table is (delay, place row, setup before, setup after, slack):
+    the delay of the action, the logical row where the first setup starts,
+    the setup times around the part and the free rows left between the part and the next job.
+    """
+    drop_len: int
+    table: np.ndarray
+
+    def __init__(self, drop_len: int, table: np.ndarray):
+        self.drop_len = drop_len
+        self.table = table
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    @property
+    def delay(self) -> np.ndarray:
+        return self.table[:, 0]
+
+    @property
+    def row(self) -> np.ndarray:
+        return self.table[:, 1]
+
+    @property
+    def setup_before(self) -> np.ndarray:
+        return self.table[:, 2]
+
+    @property
+    def setup_after(self) -> np.ndarray:
+        return self.table[:, 3]
+
+    @property
+    def slack(self) -> np.ndarray:
+        return self.table[:, 4]
+
+
+class ActionCache:
+    """
+    Cache of the column profiles and of the available actions of each job.
+    A column profile stays valid until its column is written, a time shift rebases it.
+    The placements of a job are keyed by its state (drop column, remaining parts, current time,
+    column version and base time), so they are only searched again when one of them changed.
+    """
+    profiles: dict[int, tuple[int, int, ColumnProfile]]
+    jobs: dict[object, tuple]
+
+    def __init__(self):
+        self.profiles = {}      # column -> (column version, base time, profile)
+        self.jobs = {}          # job -> (state, placements, action key, action entries, action list, action indices)
+
+    def clear(self):
+        self.profiles.clear()
+        self.jobs.clear()
+
+    def get_profile(self, col: int, version: int, base_time: int) -> ColumnProfile:
+        """
+        Get the cached profile of the column, rebased to base_time (None if the column was written).
+        """
+        cached = self.profiles.get(col)
+        if cached is None or cached[0] != version or cached[1] > base_time:
+            return None
+        profile = cached[2]
+        if cached[1] < base_time:
+            profile = profile.shifted(base_time - cached[1])
+            self.profiles[col] = (version, base_time, profile)
+        return profile
+
+    def store_profile(self, col: int, version: int, base_time: int, profile: ColumnProfile):
+        self.profiles[col] = (version, base_time, profile)
+
+    def get_placements(self, job, state: tuple) -> Placements:
+        """
+        Get the cached placements of the job (None if its state changed).
+        """
+        cached = self.jobs.get(job)
+        if cached is None or cached[0] != state:
+            return None
+        return cached[1]
+
+    def get_actions(self, job, state: tuple, key: int) -> tuple[dict, list, np.ndarray]:
+        """
+        Get the cached action entries, action list and action indices of the job in the slot key
+        (None if its state or its slot changed).
+        """
+        cached = self.jobs.get(job)
+        if cached is None or cached[0] != state or cached[2] != key:
+            return None
+        return cached[3], cached[4], cached[5]
+
+    def get_last_placements(self, job) -> Placements:
+        """
+        Get the placements of the job at its last cached state (None if it has none).
+        """
+        cached = self.jobs.get(job)
+        return None if cached is None else cached[1]
+
+    def store(self, job, state: tuple, key: int, placements: Placements, entries: dict, actions: list, indices: np.ndarray = None):
+        self.jobs[job] = (state, placements, key, entries, actions, indices)
+
+    def discard(self, job):
+        """
+        Forget a finished job.
+        """
+        self.jobs.pop(job, None)
+
+    def fork(self, jobs: dict) -> "ActionCache":
+        """
+        Get a copy of the cache for a forked model, jobs maps each job of this cache to its copy.
+        The cached profiles, placements and action entries are never changed, so they are shared.
+        """
+        cache = ActionCache()
+        cache.profiles = self.profiles.copy()
+        cache.jobs = {jobs[job]: cached for job, cached in self.jobs.items() if job in jobs}
+        return cache
+
+
+def enumerate_placements(profile: ColumnProfile, drop_len: int, start_row: int, after_previous_part: bool,
+                         setup_from: np.ndarray, setup_to: np.ndarray, row_limit: int) -> Placements:
+    """
+    Enumerate every feasible placement of a drop part in the column described by profile.
+    start_row is the lowest logical row the part may use: the end of the previous part of the job
+    when after_previous_part is True, otherwise the bottom row of the grid.
+    setup_from[v] is the setup time from the job type with grid id v to the dropped job type,
+    setup_to[v] the setup time from the dropped job type to the job type with grid id v.
+    row_limit bounds the logical row where the setup, part and next setup have to end.
+    Follows the same search as the cell by cell scan of the grid:
+    the setup before the part comes from the job found below start_row,
+    then each gap between jobs gives a run of consecutive delays.
+    """
+    height = profile.HEIGHT
+
+    # Find the job below the start row to get the first setup time
+    job_below = profile.prev_job_row(start_row - 1)
+    if job_below >= 0:
+        available_space = start_row - 1 - job_below + (1 if after_previous_part else 0)
+        cur_setup_time = int(setup_from[profile.value(job_below)])
+    else:
+        available_space = 0
+        cur_setup_time = 0
+    cur_row = start_row - cur_setup_time
+    if cur_setup_time > available_space:
+        cur_row += available_space
+
+    # Walk the gaps above the start row
+    cur_delay = 0
+    num_delays = 0
+    gaps = []   # (first entry, first delay, first row, setup before, setup after, slack of the first delay, slack bounded by a job)
+    counts = []
+    while cur_row + cur_setup_time + drop_len < row_limit:
+        job_row = profile.next_job_row(cur_row)
+        available_space = max(job_row - cur_row, 0)
+        if job_row < height:
+            next_job_len = profile.next_free_row(job_row) - job_row
+            next_value = profile.value(job_row)
+            next_setup_time = int(setup_to[next_value])
+            check_delay = available_space - (cur_setup_time + drop_len + next_setup_time)
+            if check_delay >= 0:
+                gaps.append((num_delays, cur_delay, cur_row, cur_setup_time, next_setup_time, check_delay, 1))
+                counts.append(check_delay + 1)
+                num_delays += check_delay + 1
+                cur_delay += check_delay + 1
+                cur_row += check_delay + 1
+                cur_delay += next_job_len
+            cur_setup_time = int(setup_from[next_value])
+            cur_row += next_job_len
+        else:
+            check_delay = available_space - (cur_setup_time + drop_len)
+            if check_delay >= 0:
+                gaps.append((num_delays, cur_delay, cur_row, cur_setup_time, 0, 0, 0))
+                counts.append(check_delay + 1)
+                num_delays += check_delay + 1
+            break
+
+    # Expand the gaps into one entry per delay
+    if not gaps:
+        return Placements(drop_len, np.zeros((0, 5), dtype=int))
+    entries = np.repeat(np.array(gaps, dtype=int), counts, axis=0)
+    offsets = np.arange(num_delays) - entries[:, 0]
+    table = entries[:, 1:6]
+    table[:, 0] += offsets                                  # delay
+    table[:, 1] += offsets                                  # place row
+    table[:, 4] = (table[:, 4] - offsets) * entries[:, 6]   # slack, 0 in the last (unbounded) gap
+    return Placements(drop_len, table)
@@ -0,0 +1,387 @@
+import math
+import random
+import time
+import multiprocessing as mp
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from JobModel import ScheduleModel
+
+MCTS_SIMULATIONS = 200      # Default number of simulations per move of each worker
+EXPLORATION = 1.4           # UCT exploration constant, applied to values normalized to [0, 1]
+ROLLOUT_DEPTH = 30          # Moves of a rollout before its value is estimated
+BEAM_WIDTH = 8              # Default number of states kept by the beam search
+BEAM_DEPTH = 3              # Default number of moves looked ahead by the beam search
+MAX_DELAYS = 2              # Delays of each block tried by the search, from the smallest
+TABLE_SIZE = 100000         # Default number of states kept by a transposition table
+
+
+class PlannerStats:
+    """
+    Throughput counters of a planner.
+    nodes counts the states created by a move (tree nodes or beam candidates), rollouts the simulations
+    and steps every move executed, in the tree or in a rollout.
+    """
+    nodes: int
+    rollouts: int
+    steps: int
+    seconds: float
+
+    def __init__(self, nodes: int = 0, rollouts: int = 0, steps: int = 0, seconds: float = 0.0):
+        self.nodes = nodes
+        self.rollouts = rollouts
+        self.steps = steps
+        self.seconds = seconds              # Wall time of the searches
+
+    def add(self, other: "PlannerStats", seconds: float = None):
+        """
+        Add the counters of other, seconds replaces its time (the workers of a search run at the same time).
+        """
+        self.nodes += other.nodes
+        self.rollouts += other.rollouts
+        self.steps += other.steps
+        self.seconds += other.seconds if seconds is None else seconds
+
+    @property
+    def nodes_per_second(self) -> float:
+        return self.nodes / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def rollouts_per_second(self) -> float:
+        return self.rollouts / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def steps_per_second(self) -> float:
+        return self.steps / self.seconds if self.seconds > 0 else 0.0
+
+    def __repr__(self) -> str:
+        return (f"PlannerStats({self.nodes} nodes, {self.rollouts} rollouts, {self.steps} steps in {self.seconds:.3f} s: "
+                f"{self.nodes_per_second:.0f} nodes/s, {self.rollouts_per_second:.0f} rollouts/s)")
+
+
+class TranspositionTable:
+    """
+    Bounded cache of values by state, keyed by ScheduleModel.get_state_hash().
+    When full, the least recently used state is evicted.
+    """
+    capacity: int
+    entries: OrderedDict
+    hits: int
+    misses: int
+
+    def __init__(self, capacity: int = TABLE_SIZE):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self.entries
+
+    def get(self, key: int, default=None):
+        """
+        Get the value of the state, it becomes the most recently used.
+        """
+        value = self.entries.get(key, default)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+        return value
+
+    def put(self, key: int, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+def evaluate(model: ScheduleModel) -> float:
+    """
+    Estimate the total reward of the game from the model.
+    The parts of a job run one after the other, so a job of the job list finishes at the earliest after its
+    remaining work, from the current time or the end of its last part. Adding the reward of these earliest
+    finishes keeps a truncated search from favouring waiting.
+    """
+    return model.total_reward + sum(
+        job.appear_time - max(model.base_time, job.curr_time) - job.remaining_work for job in model.job_list
+    )
+
+
+def random_rollout_policy(model: ScheduleModel, rng: random.Random) -> tuple[int, int]:
+    return rng.choice(model.get_available_actions())
+
+
+def earliest_rollout_policy(model: ScheduleModel, rng: random.Random) -> tuple[int, int]:
+    """
+    Place the next part of a random job with its smallest delay, or let the time go by if no job can be placed.
+    """
+    actions = model.get_available_actions()
+    if len(actions) == 1:
+        return actions[0]
+    block = rng.choice(actions[1:])[0]
+    return min((action for action in actions if action[0] == block), key=lambda action: action[1])
+
+
+def quiet_fork(model: ScheduleModel) -> ScheduleModel:
+    """
+    Get a fork of the model that does not print the reward of the games it finishes, the root of a search.
+    """
+    fork = model.fork()
+    fork.verbose = False
+    return fork
+
+
+def candidate_actions(model: ScheduleModel, max_delays: int = MAX_DELAYS) -> list[tuple[int, int]]:
+    """
+    Get the actions searched from the model: the time action and the max_delays smallest delays of each block.
+    Larger delays only leave the machine idle longer, pruning them keeps the branching factor near the number of jobs.
+    """
+    actions = []
+    tried = {}
+    for action in sorted(model.get_available_actions(), key=lambda action: action[1]):
+        if action[0] == 0 or tried.get(action[0], 0) < max_delays:
+            tried[action[0]] = tried.get(action[0], 0) + 1
+            actions.append(action)
+    return actions
+
+
+class Node:
+    """
+    Node of the search tree, owns a forked model of its state.
+    """
+    model: ScheduleModel
+    parent: "Node"
+    action: tuple[int, int]
+    children: list["Node"]
+    untried: list[tuple[int, int]]
+    visits: int
+    value: float
+
+    def __init__(self, model: ScheduleModel, parent: "Node" = None, action: tuple[int, int] = None, max_delays: int = MAX_DELAYS):
+        self.model = model
+        self.parent = parent
+        self.action = action                    # Action leading from the parent to this node
+        self.children = []
+        self.untried = [] if model.game_over else candidate_actions(model, max_delays)
+        self.visits = 0
+        self.value = 0.0                        # Sum of the values of the simulations through this node
+
+
+class MCTSPlanner:
+    """
+    UCT Monte Carlo tree search over ScheduleModel states.
+    Each simulation selects a leaf with UCB1, expands one untried action, plays a rollout of at most
+    rollout_depth moves from it and backs up its value (see evaluate, normalized over the values seen).
+    With num_workers > 1 the search is root parallel: each worker process grows its own tree with its
+    own seed and the root statistics are summed.
+    A search stops after simulations simulations per worker or time_limit seconds, whichever comes first,
+    so the budget of a move is time_limit times the simulation rate reported by stats.
+    """
+    simulations: int
+    time_limit: float
+    exploration: float
+    rollout_depth: int
+    rollout_policy: object
+    max_delays: int
+    num_workers: int
+    seed: int
+    stats: PlannerStats
+    pool: ProcessPoolExecutor
+
+    def __init__(self, simulations: int = MCTS_SIMULATIONS, time_limit: float = None, exploration: float = EXPLORATION,
+                 rollout_depth: int = ROLLOUT_DEPTH, rollout_policy=None, max_delays: int = MAX_DELAYS,
+                 num_workers: int = 1, seed: int = 0):
+        self.simulations = simulations
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.rollout_depth = rollout_depth
+        self.rollout_policy = rollout_policy or earliest_rollout_policy     # Picklable function (model, rng) -> action
+        self.max_delays = max_delays
+        self.num_workers = num_workers
+        self.seed = seed
+        self.stats = PlannerStats()
+        self.pool = None
+
+    def plan(self, model: ScheduleModel) -> tuple[int, int]:
+        """
+        Get the most visited action of a search from the model.
+        If no root action was visited (no simulation in the budget, or the game is over), the first available action is returned.
+        """
+        root = self.search(model)
+        if not root:
+            return model.get_available_actions()[0]
+        return max(root, key=lambda action: root[action][0])
+
+    def action_probabilities(self, model: ScheduleModel, temperature: float = 1.0) -> np.ndarray:
+        """
+        Get the visit distribution of a search over the flat action space (a teacher policy for the DQN).
+        If no root action was visited, all the probability is on the first available action (as plan).
+        """
+        root = self.search(model)
+        probabilities = np.zeros(model.get_action_space_size())
+        for action, (visits, _) in root.items():
+            probabilities[model.encode_action(action)] = visits ** (1 / temperature)
+        total = probabilities.sum()
+        if total == 0:
+            probabilities[model.encode_action(model.get_available_actions()[0])] = total = 1.0
+        return probabilities / total
+
+    def search(self, model: ScheduleModel) -> dict[tuple[int, int], tuple[int, float]]:
+        """
+        Search from the model (not changed), return the visits and mean value of each root action.
+        """
+        self.seed += 1
+        start = time.perf_counter()
+        params = (self.simulations, self.time_limit, self.exploration, self.rollout_depth, self.rollout_policy, self.max_delays)
+        if self.num_workers <= 1:
+            results = [_grow_tree(model, self.seed, *params)]
+        else:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(self.num_workers, mp_context=mp.get_context())
+            futures = [self.pool.submit(_grow_tree, model, self.seed * self.num_workers + i, *params) for i in range(self.num_workers)]
+            results = [future.result() for future in futures]
+
+        # Sum the root statistics of the workers
+        root = {}
+        stats = PlannerStats()
+        for children, worker_stats in results:
+            stats.add(worker_stats)
+            for action, (visits, value) in children.items():
+                total_visits, total_value = root.get(action, (0, 0.0))
+                root[action] = (total_visits + visits, total_value + value)
+        self.stats.add(stats, time.perf_counter() - start)
+        return {action: (visits, value / max(visits, 1)) for action, (visits, value) in root.items()}
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+class BeamSearchPlanner:
+    """
+    Beam search over ScheduleModel states: every state of the beam is expanded with its candidate actions
+    (see candidate_actions), and the width best states (by evaluate) are kept for the next depth.
+    The children are forks of their parents, so a depth costs one fork and one move per candidate.
+    A state reached again by another order of the same moves is only kept once (see TranspositionTable).
+    """
+    width: int
+    depth: int
+    max_delays: int
+    stats: PlannerStats
+    table: TranspositionTable
+
+    def __init__(self, width: int = BEAM_WIDTH, depth: int = BEAM_DEPTH, max_delays: int = MAX_DELAYS):
+        self.width = width
+        self.depth = depth
+        self.max_delays = max_delays
+        self.stats = PlannerStats()
+        self.table = TranspositionTable()
+
+    def plan(self, model: ScheduleModel) -> tuple[int, int]:
+        """
+        Get the first action of the best sequence found from the model (not changed).
+        """
+        start = time.perf_counter()
+        stats = PlannerStats()
+        self.table.clear()
+        root = quiet_fork(model)
+        beam = [(evaluate(root), None, root)]
+        for _ in range(self.depth):
+            states = [(action, state) for _, action, state in beam if not state.game_over]
+            if not states:
+                break
+            candidates = [(value, action, state) for value, action, state in beam if state.game_over]
+            expanded = _expand(states, self.max_delays, self.table)
+            candidates.extend(expanded)
+            stats.nodes += len(expanded)
+            stats.steps += len(expanded)
+            candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+            beam = candidates[:self.width]
+        self.stats.add(stats, time.perf_counter() - start)
+        return beam[0][1] if beam[0][1] is not None else model.get_available_actions()[0]
+
+
+def _grow_tree(model: ScheduleModel, seed: int, simulations: int, time_limit: float, exploration: float,
+               rollout_depth: int, rollout_policy, max_delays: int) -> tuple[dict, PlannerStats]:
+    """
+    Grow one search tree from the model (see MCTSPlanner),
+    return the visits and value sums of the root actions and the counters.
+    """
+    rng = random.Random(seed)
+    stats = PlannerStats()
+    start = time.perf_counter()
+    deadline = None if time_limit is None else start + time_limit
+    root = Node(quiet_fork(model), max_delays=max_delays)
+    low, high = math.inf, -math.inf            # Range of the values seen, to normalize them
+    for _ in range(simulations):
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+
+        # Selection
+        node = root
+        while not node.untried and node.children:
+            scale = high - low if high > low else 1.0
+            log_visits = math.log(node.visits)
+            node = max(node.children, key=lambda child: (child.value / child.visits - low) / scale
+                       + exploration * math.sqrt(log_visits / child.visits))
+
+        # Expansion
+        if node.untried:
+            action = node.untried.pop(rng.randrange(len(node.untried)))
+            child_model = node.model.fork()
+            child_model.execute_move(action)
+            child = Node(child_model, node, action, max_delays)
+            node.children.append(child)
+            node = child
+            stats.nodes += 1
+            stats.steps += 1
+
+        # Rollout
+        simulation = node.model.fork()
+        for _ in range(rollout_depth):
+            if simulation.game_over:
+                break
+            simulation.execute_move(rollout_policy(simulation, rng))
+            stats.steps += 1
+        value = evaluate(simulation)
+        stats.rollouts += 1
+        low, high = min(low, value), max(high, value)
+
+        # Backpropagation
+        while node is not None:
+            node.visits += 1
+            node.value += value
+            node = node.parent
+    stats.seconds = time.perf_counter() - start
+    return {child.action: (child.visits, child.value) for child in root.children}, stats
+
+
+def _expand(states: list[tuple[tuple[int, int], ScheduleModel]], max_delays: int,
+            table: TranspositionTable) -> list[tuple[float, tuple[int, int], ScheduleModel]]:
+    """
+    Expand each (first action, state) with its candidate actions,
+    return the (value, first action, state) of the children.
+    A child is dropped if table already holds its state with a value at least as good.
+    """
+    children = []
+    for first_action, state in states:
+        for action in candidate_actions(state, max_delays):
+            child = state.fork()
+            child.execute_move(action)
+            value = evaluate(child)
+            key = child.get_state_hash()
+            best = table.get(key)
+            if best is not None and best >= value:
+                continue
+            table.put(key, value)
+            children.append((value, action if first_action is None else first_action, child))
+    return children
@@ -0,0 +1,53 @@
+import os
+import random
+import sys
+import JobModel
+from JobPlanner import MCTSPlanner, BeamSearchPlanner, PlannerStats
+
+NUM_STATES = 5              # Number of game states searched
+WARMUP_STEPS = 50           # Random moves played before searching, so the states are not all empty
+TIME_LIMIT = 2.0            # Seconds of each MCTS search
+
+
+def get_states(num_states: int) -> list[JobModel.ScheduleModel]:
+    rng = random.Random(0)
+    states = []
+    while len(states) < num_states:
+        model = JobModel.ScheduleModel(verbose=False)
+        model.start_game()
+        for _ in range(rng.randrange(WARMUP_STEPS)):
+            if model.game_over:
+                break
+            model.execute_move(rng.choice(model.get_available_actions()))
+        if not model.game_over:
+            states.append(model)
+    return states
+
+
+if __name__ == "__main__":
+    # Usage: python JobPlannerBenchmark.py [max_workers] [num_states]
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    num_states = int(sys.argv[2]) if len(sys.argv) > 2 else NUM_STATES
+    states = get_states(num_states)
+    print(f"{num_states} states, {os.cpu_count()} cpus")
+
+    beam = BeamSearchPlanner()
+    for state in states:
+        beam.plan(state)
+    print(f"beam search      {beam.stats.nodes_per_second:10.0f} nodes/s")
+
+    base = None
+    num_workers = 1
+    while num_workers <= max_workers:
+        # The simulation budget is large enough for the time limit to end each search
+        planner = MCTSPlanner(simulations=10 ** 9, time_limit=TIME_LIMIT, num_workers=num_workers)
+        planner.search(states[0])            # Start the worker processes before measuring
+        planner.stats = PlannerStats()
+        for state in states:
+            planner.search(state)
+        planner.close()
+        rate = planner.stats.rollouts_per_second
+        base = base or rate
+        print(f"mcts {num_workers:2d} workers  {planner.stats.nodes_per_second:10.0f} nodes/s "
+              f"{rate:10.0f} rollouts/s   {rate / base:5.2f} x")
+        num_workers *= 2
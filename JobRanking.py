@@ -0,0 +1,141 @@
+from bisect import bisect_left, insort
+
+
+class JobRanking:
+    """
+    Order of the job list for the slot window of ScheduleModel: the window shows the first num_slots jobs of the ranking.
+    The jobs are kept sorted by (key, arrival number) and only the jobs changed by a move are keyed again:
+    a released job is inserted, a job that dropped a part is moved and a finished job is removed,
+    so a move costs O(log n) comparisons instead of sorting the whole job list.
+    The base ranking keeps the jobs by release time, subclasses change the order by overriding key.
+    If column_keys is set, the key also depends on the top job of the drop column of the job (see column_top),
+    and the jobs waiting on a column are keyed again when its top changes.
+    """
+    column_keys = False
+    entries: list[tuple]
+    keys: dict[object, tuple]
+    columns: dict[int, dict]
+    tops: list[int]
+    counter: int
+
+    def __init__(self):
+        self.entries = []       # (key, arrival number, job), sorted
+        self.keys = {}          # job -> (entry, drop column when it was keyed)
+        self.columns = {}       # drop column -> jobs waiting on it, only kept with column_keys
+        self.tops = None        # Top grid id of each column, only kept with column_keys
+        self.counter = 0        # Number of jobs added, breaks the ties in arrival order
+
+    def key(self, model, job):
+        """
+        Sort key of the job, the smallest key gets the first slot.
+        """
+        return job.appear_time
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def top(self, k: int) -> list:
+        """
+        Get the first k jobs of the ranking.
+        """
+        return [entry[2] for entry in self.entries[:k]]
+
+    def add(self, model, job):
+        """
+        Insert a job released into the job list.
+        """
+        if self.column_keys and self.tops is None:
+            self.tops = [column_top(model, col) for col in range(model.grid.WIDTH)]
+        self.counter += 1
+        self._insert(model, job, self.counter)
+
+    def remove(self, job):
+        """
+        Remove a finished job.
+        """
+        entry, col = self.keys.pop(job)
+        del self.entries[bisect_left(self.entries, entry)]
+        if col is not None:
+            del self.columns[col][job]
+
+    def update(self, model, job):
+        """
+        Key again a job that dropped a part, it keeps its arrival number.
+        """
+        number = self.keys[job][0][1]
+        self.remove(job)
+        self._insert(model, job, number)
+
+    def written(self, model, col: int):
+        """
+        Key again the jobs waiting on the column col if its top changed, after a write into the column.
+        """
+        if self.column_keys and self.tops is not None:
+            self._refresh(model, col % model.grid.WIDTH)
+
+    def advance(self, model):
+        """
+        Key again the jobs waiting on the columns whose top left the grid, after a time shift.
+        """
+        if self.column_keys and self.tops is not None:
+            for col in range(len(self.tops)):
+                self._refresh(model, col)
+
+    def fork(self, jobs: dict) -> "JobRanking":
+        """
+        Get a copy of the ranking for a forked model, jobs maps each job of this ranking to its copy.
+        """
+        ranking = self.__class__.__new__(self.__class__)
+        ranking.__dict__.update(self.__dict__)
+        ranking.entries = [(key, number, jobs[job]) for key, number, job in self.entries]
+        entries = {entry[1]: entry for entry in ranking.entries}       # Arrival number -> copied entry
+        ranking.keys = {jobs[job]: (entries[entry[1]], col) for job, (entry, col) in self.keys.items()}
+        ranking.columns = {col: {jobs[job]: None for job in waiting} for col, waiting in self.columns.items()}
+        ranking.tops = None if self.tops is None else self.tops.copy()
+        return ranking
+
+    def _insert(self, model, job, number: int):
+        entry = (self.key(model, job), number, job)
+        insort(self.entries, entry)
+        col = None
+        if self.column_keys:
+            col = job.drop_col % model.grid.WIDTH
+            self.columns.setdefault(col, {})[job] = None
+        self.keys[job] = (entry, col)
+
+    def _refresh(self, model, col: int):
+        top = column_top(model, col)
+        if top == self.tops[col]:
+            return
+        self.tops[col] = top
+        for job in list(self.columns.get(col, ())):
+            self.update(model, job)
+
+
+class RemainingWorkRanking(JobRanking):
+    """
+    Shortest remaining work first, then by release time.
+    """
+    def key(self, model, job):
+        return (job.remaining_work, job.appear_time)
+
+
+class SetupAffinityRanking(JobRanking):
+    """
+    Smallest setup time after the top job of the drop column first, then by release time:
+    the jobs that continue the current job of their machine come first.
+    """
+    column_keys = True
+
+    def key(self, model, job):
+        col = job.drop_col
+        setup = model.scenario.setup_tensor[col % model.scenario.num_cols][self.tops[col], job.id]
+        return (int(setup), job.appear_time)
+
+
+def column_top(model, col: int) -> int:
+    """
+    Get the grid id of the top job of the column col of the model (0 for a column without a job).
+    """
+    values = model.grid.intervals[col].values
+    return next((value for value in reversed(values) if value > 1), 0)
@@ -0,0 +1,107 @@
+import numpy as np
+import JobModel
+import JobUtils
+
+SCREEN_SIZE = (1920, 1080)      # Default size of the rendered frame (width, height)
+TOP_TEXT_MARGIN = 20            # Rows above the grid kept for the labels
+BACKGROUND = (200, 200, 200)    # Light grey
+BORDER = (255, 255, 255)        # White
+TIME_LINE = (255, 0, 0)         # Red
+
+
+class NumpyRenderer:
+    """
+    Headless renderer of the scheduler, without pygame or a display.
+    Draws the same layout as JobSchedulerEnv.render (the grid on the left, then one slot per job),
+    except the text labels. Cells are colored through a palette lookup table, upscaled with np.repeat
+    and covered by a cached overlay of the cell borders.
+    Frames are (width, height, 3) arrays, like pygame.surfarray.
+    """
+    screen_size: tuple[int, int]
+    num_slots: int
+    show_hidden: bool
+    palette: np.ndarray
+    background: np.ndarray
+    borders: dict[tuple[int, int, int], np.ndarray]
+
+    def __init__(self, num_types: int, screen_size: tuple[int, int] = SCREEN_SIZE, num_slots: int = JobModel.NUM_BLOCKS, show_hidden: bool = False):
+        self.screen_size = screen_size
+        self.num_slots = num_slots
+        self.show_hidden = show_hidden
+        self.palette = np.array([JobUtils.get_color(i) for i in range(num_types + 2)], dtype=np.uint8)    # Color of each grid id
+        self.background = np.empty((screen_size[0], screen_size[1], 3), dtype=np.uint8)
+        self.background[:] = BACKGROUND
+        self.borders = {}       # (cols, rows, block size) -> border mask of a block of cells
+
+    def slot_size(self) -> tuple[int, int]:
+        return (self.screen_size[0] // (self.num_slots + 1), self.screen_size[1] - TOP_TEXT_MARGIN)
+
+    def block_size(self, grid_width: int, grid_height: int) -> int:
+        """
+        Get the size in pixels of one cell, the whole grid fits in the first slot.
+        """
+        slot_size = self.slot_size()
+        return min(slot_size[0] // grid_width - 1, slot_size[1] // grid_height)
+
+    def render(self, model, out: np.ndarray = None) -> np.ndarray:
+        """
+        Render the model, return the frame as a (width, height, 3) uint8 array.
+        If out is given, the frame is drawn into it instead of a new array.
+        """
+        if out is None:
+            frame = self.background.copy()
+        else:
+            frame = out
+            frame[:] = self.background
+        slot_size = self.slot_size()
+
+        # Draw the grid on the left side of the screen, from bottom to top
+        hidden_height = model.scenario.max_setup_time
+        grid = model.grid.grid if self.show_hidden else model.grid.grid[hidden_height:]
+        grid_height, grid_width = grid.shape
+        block_size = self.block_size(grid_width, grid_height)
+        if block_size <= 0:
+            return frame
+        self.draw_cells(frame, self.palette[grid[::-1]], 0, TOP_TEXT_MARGIN, block_size)
+
+        # Draw a red line for current time if hidden part is shown (counting from bottom of the grid)
+        if self.show_hidden:
+            line_y = (grid_height - hidden_height) * block_size + TOP_TEXT_MARGIN
+            frame[:grid_width * block_size + 1, line_y:line_y + 2] = TIME_LINE
+
+        # Draw the jobs of the window of the model on each slot
+        for i, job in enumerate(model.window[:self.num_slots]):
+            starting_x = slot_size[0] * (i + 1)
+            job_shape = job.rotated_shape
+            self.draw_cells(frame, self.palette[np.where(job_shape != 0, job.id, 0)], starting_x, TOP_TEXT_MARGIN, block_size)
+        return frame
+
+    def draw_cells(self, frame: np.ndarray, colors: np.ndarray, x: int, y: int, block_size: int):
+        """
+        Draw a (rows, cols, 3) array of cell colors with its top left corner at (x, y),
+        each cell is a block_size square with a white border. Cells outside the frame are clipped.
+        """
+        rows, cols = colors.shape[:2]
+        width = min(cols * block_size, frame.shape[0] - x)
+        height = min(rows * block_size, frame.shape[1] - y)
+        if height <= 0 or width <= 0:
+            return
+        rows = -(-height // block_size)
+        cols = -(-width // block_size)
+        colors = colors[:rows, :cols].transpose(1, 0, 2)       # Same (x, y) order as the frame
+        block = np.repeat(np.repeat(colors, block_size, axis=0), block_size, axis=1)[:width, :height]
+        block[self.border_mask(cols, rows, block_size)[:width, :height]] = BORDER
+        frame[x:x + width, y:y + height] = block
+
+    def border_mask(self, cols: int, rows: int, block_size: int) -> np.ndarray:
+        """
+        Get the cached (x, y) mask of the cell borders of a block of cols x rows cells.
+        """
+        key = (cols, rows, block_size)
+        mask = self.borders.get(key)
+        if mask is None:
+            edge = np.zeros(block_size, dtype=bool)
+            edge[[0, -1]] = True
+            mask = np.tile(edge, cols)[:, None] | np.tile(edge, rows)[None, :]
+            self.borders[key] = mask
+        return mask
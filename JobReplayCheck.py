@@ -0,0 +1,290 @@
+import copy
+import os
+import pickle
+import random
+import sys
+import numpy as np
+import JobModel
+from JobBatchModel import BatchScheduleModel
+from JobPlacement import ActionCache, ColumnProfile
+
+DATASETS = ("./data", "./new_data", "./tests")     # Data sets replayed by default
+NUM_GAMES = 4               # Number of games replayed in lockstep per data set
+WHAT_IF_INTERVAL = 5        # evaluate_actions is checked every WHAT_IF_INTERVAL steps (one fork per action)
+COPY_INTERVAL = 10          # Deep-copied and pickled games are played to the end every COPY_INTERVAL steps
+HISTORY_CHUNK_ROWS = 4      # Chunk rows of the grid history of the checked models
+HISTORY_SPILL_ROWS = 8      # The checked models spill their grid history into a file past this many rows
+
+
+class TickingModel(JobModel.ScheduleModel):
+    """
+    ScheduleModel with the original check_status: the time goes by one unit at a time
+    while the bottom line is full or the job list is empty.
+    """
+    def check_status(self):
+        steps = 0
+        while True:
+            if self.check_bottom_full():
+                pass
+            elif not self.job_list and self.num_jobs > 0:
+                if self.arrivals.next_release() is None:
+                    self.num_jobs = 0
+                    break
+            else:
+                break
+            self.advance_time(1)
+            steps += 1
+        if not self.job_list and self.num_jobs == 0 and not self.online:
+            self.end_game(steps + 1)
+
+
+def reference_delay_actions(model: JobModel.ScheduleModel, slot: int) -> dict[int, tuple[int, int, int, int, int]]:
+    """
+    Get the available action entries of the job of the slot by the original scan of the grid cells,
+    delay -> (place row, setup before, drop length, setup after, slack) as in ScheduleModel.available_action.
+    """
+    scenario = model.scenario
+    hidden_rows = scenario.max_setup_time
+    grid = model.grid.grid.astype(np.int64).tolist()
+    job = model.window[slot]
+    drop_col = job.drop_col
+    drop_len = job.drop_len
+    setup = scenario.setup_tensor[drop_col % scenario.num_cols]
+
+    # Top job below the start of the part and the setup time after it
+    cur_top = 0
+    cur_time = model.base_time
+    cur_setup_time = 0
+    available_space = 0
+    if job.curr_time > model.base_time:
+        for y in range(job.curr_time - 1 - model.base_time + hidden_rows, -1, -1):
+            available_space += 1
+            if grid[y][drop_col] > 1:
+                cur_top = grid[y][drop_col]
+                break
+        if cur_top != 0:
+            cur_setup_time = int(setup[cur_top, job.id])
+        cur_time = job.curr_time - cur_setup_time
+    else:
+        for y in range(hidden_rows - 1, -1, -1):
+            if grid[y][drop_col] > 1:
+                cur_top = grid[y][drop_col]
+                break
+            available_space += 1
+        if cur_top != 0:
+            cur_setup_time = int(setup[cur_top, job.id])
+            cur_time = cur_time - cur_setup_time
+    if cur_top != 0 and cur_setup_time - available_space > 0:
+        cur_time += available_space
+
+    # Walk the gaps of the column from the start row
+    entries = {}
+    cur_delay = 0
+    while cur_time + cur_setup_time + drop_len < model.max_time + model.base_time + hidden_rows:
+        available_space = 0
+        next_job_len = 0
+        next_job = 0
+        for y in range(cur_time - model.base_time + hidden_rows, model.max_time + hidden_rows - model.base_time):
+            if next_job != 0:
+                if grid[y][drop_col] == 0:
+                    break
+                next_job_len += 1
+            elif grid[y][drop_col] <= 1:
+                available_space += 1
+            else:
+                next_job = grid[y][drop_col]
+                next_job_len += 1
+        next_setup_time = int(setup[job.id, next_job]) if next_job != 0 else 0
+        check_delay = available_space - (cur_setup_time + drop_len + next_setup_time)
+        if check_delay >= 0:
+            for i in range(check_delay + 1):
+                slack = check_delay - i if next_job != 0 else 0
+                entries[cur_delay] = (cur_time - model.base_time + hidden_rows, cur_setup_time, drop_len, next_setup_time, slack)
+                cur_delay += 1
+                cur_time += 1
+            cur_delay += next_job_len
+        if next_job == 0:
+            break
+        cur_setup_time = int(setup[next_job, job.id])
+        cur_time += next_job_len
+    return entries
+
+
+def reference_gaps(model: JobModel.ScheduleModel, col: int, min_length: int) -> list[tuple[int, int, str, str]]:
+    """
+    Get the gaps of the column col from the oldest hidden row on by a scan of its cells (see ScheduleModel.get_gaps).
+    """
+    column = model.grid.column(col).astype(np.int64).tolist()
+    time = model.base_time - model.scenario.max_setup_time
+    job_id = model.scenario.job_id
+    gaps = []
+    row = 0
+    while row < len(column):
+        if column[row] > 1:
+            row += 1
+            continue
+        end = row
+        while end < len(column) and column[end] <= 1:
+            end += 1
+        if end - row >= min_length:
+            below = job_id.get(column[row - 1]) if row > 0 else None
+            above = job_id.get(column[end]) if end < len(column) else None
+            gaps.append((row + time, end - row, below, above))
+        row = end
+    return gaps
+
+
+def check(condition: bool, message: str):
+    if not condition:
+        raise AssertionError(message)
+
+
+def check_model(model: JobModel.ScheduleModel, twin: TickingModel, where: str):
+    """
+    Compare the model with the reference scans and with the twin ticking the time one unit at a time.
+    """
+    # Event skipping: same time, reward, grid, history and actions as ticking
+    check(model.base_time == twin.base_time and model.total_reward == twin.total_reward, f"{where}: time or reward differs from ticking")
+    check(np.array_equal(model.grid.grid, twin.grid.grid), f"{where}: grid differs from ticking")
+    check(np.array_equal(model.grid_history.forward(), twin.grid_history.forward()), f"{where}: grid history differs from ticking")
+    check(model.game_over == twin.game_over, f"{where}: game over differs from ticking")
+    if model.game_over:
+        return
+    check(model.get_available_actions() == twin.get_available_actions(), f"{where}: available actions differ from ticking")
+
+    # Interval index: column profiles and gaps of the dense grid
+    for col in range(model.grid.WIDTH):
+        profile = model.grid.intervals[col].profile()
+        dense = ColumnProfile.from_column(model.grid.column(col))
+        check((profile.starts, profile.ends, profile.values) == (dense.starts, dense.ends, dense.values), f"{where}: profile of column {col}")
+        for min_length in (1, 2):
+            gaps = model.get_gaps(col, model.base_time - model.scenario.max_setup_time, min_length)
+            check(gaps == reference_gaps(model, col, min_length), f"{where}: gaps of column {col}")
+
+    # Placement engine: action entries of the original cell scan, in the same order
+    actions = [(0, 0)]
+    for slot in range(len(model.window)):
+        entries = reference_delay_actions(model, slot)
+        check(model.available_action[slot + 1] == entries, f"{where}: action entries of slot {slot + 1}")
+        actions.extend((slot + 1, delay) for delay in entries)
+    check(model.get_available_actions() == actions, f"{where}: available actions")
+
+    # Action cache: same actions as a search from an empty cache
+    fresh = model.fork()
+    fresh.action_cache = ActionCache()
+    check(fresh._get_available_actions() == actions, f"{where}: cached actions differ from a fresh search")
+    check(np.array_equal(fresh.action_mask, model.action_mask), f"{where}: cached action mask")
+
+
+def check_what_if(model: JobModel.ScheduleModel, where: str):
+    """
+    Compare evaluate_actions with executing every block action on a fork.
+    """
+    effects = model.evaluate_actions()
+    actions = model.get_available_actions()[1:]
+    check([tuple(action) for action in effects.actions.tolist()] == actions, f"{where}: evaluated actions")
+    hidden_rows = model.scenario.max_setup_time
+    visible_rows = model.grid.HEIGHT - hidden_rows
+    for i, action in enumerate(actions):
+        fork = model.fork()
+        job = fork.window[action[0] - 1]
+        drop_col = job.drop_col
+        fork.execute_move(action)
+        check(fork.step_reward == effects.reward[i], f"{where}: reward of {action}")
+        if fork.base_time == model.base_time:
+            fill = np.count_nonzero(fork.grid.grid[hidden_rows:, drop_col]) / visible_rows
+            check(fill == effects.column_fill[i], f"{where}: column fill of {action}")
+            if job in fork.job_list:
+                check(job.curr_time == effects.completion_time[i], f"{where}: completion time of {action}")
+
+
+def check_copies(model: JobModel.ScheduleModel, seed: int, where: str):
+    """
+    Play the rest of the game on a deep copy and on a pickled copy of a copy of the model, closed first,
+    in lockstep with a fork of the model, then check that the model kept its grid history and its spill file.
+    """
+    rows = model.grid_history.forward().copy()
+    path = model.grid_history.spill_path
+    source = copy.deepcopy(model)
+    copies = [copy.deepcopy(source), pickle.loads(pickle.dumps(source))]
+    source.close()
+    fork = model.fork()
+    rng = random.Random(seed)
+    while not fork.game_over:
+        action = rng.choice(fork.get_available_actions())
+        for game in [fork] + copies:
+            game.execute_move(action)
+        for game in copies:
+            check(game.base_time == fork.base_time and game.total_reward == fork.total_reward, f"{where}: time or reward of a copy")
+            check(np.array_equal(game.grid.grid, fork.grid.grid), f"{where}: grid of a copy")
+            check(np.array_equal(game.grid_history.forward(), fork.grid_history.forward()), f"{where}: grid history of a copy")
+            check(game.grid_history.spill_path is None or game.grid_history.spill_path != path, f"{where}: a copy shares the spill file")
+    for game in [fork] + copies:
+        game.close()
+    check(np.array_equal(model.grid_history.forward(), rows), f"{where}: the copies changed the grid history")
+    check(path is None or os.path.exists(path), f"{where}: the copies removed the spill file")
+
+
+def check_batch(batch: BatchScheduleModel, models: list[JobModel.ScheduleModel], where: str):
+    """
+    Compare every episode of the batch model with its ScheduleModel.
+    """
+    masks = batch.action_masks()
+    for b, model in enumerate(models):
+        check(bool(batch.game_over[b]) == model.game_over, f"{where}, game {b}: batch game over")
+        check(batch.base_time[b] == model.base_time and batch.total_reward[b] == model.total_reward, f"{where}, game {b}: batch time or reward")
+        check(np.array_equal(batch.grid(b), model.grid.grid), f"{where}, game {b}: batch grid")
+        check(np.array_equal(batch.get_history(b), model.grid_history.forward()), f"{where}, game {b}: batch grid history")
+        if not model.game_over:
+            check(sorted(batch.get_available_actions(b)) == sorted(model.get_available_actions()), f"{where}, game {b}: batch actions")
+            check(np.array_equal(masks[b], model.action_mask), f"{where}, game {b}: batch action mask")
+
+
+def replay(dataset: str, num_games: int) -> int:
+    """
+    Play num_games random games of the data set in lockstep with all the references, return the number of steps checked.
+    """
+    scenario = JobModel.load_scenario(f"{dataset}/type_info.csv", f"{dataset}/setup_info.csv", f"{dataset}/job_info.csv")
+    rngs = [random.Random(seed) for seed in range(num_games)]
+    steps = 0
+    models = [JobModel.ScheduleModel(scenario, history_chunk_rows=HISTORY_CHUNK_ROWS, history_spill_rows=HISTORY_SPILL_ROWS, verbose=False)
+              for _ in range(num_games)]
+    twins = [TickingModel(scenario, verbose=False) for _ in range(num_games)]
+    for model in models + twins:
+        model.start_game()
+    batch = BatchScheduleModel(num_games, scenario)
+    while True:
+        where = f"{dataset} step {steps}"
+        for b, (model, twin) in enumerate(zip(models, twins)):
+            check_model(model, twin, f"{where}, game {b}")
+            if not model.game_over and steps % WHAT_IF_INTERVAL == 0:
+                check_what_if(model, f"{where}, game {b}")
+            if not model.game_over and steps % COPY_INTERVAL == 0:
+                check_copies(model, steps, f"{where}, game {b}")
+        check_batch(batch, models, where)
+        if all(model.game_over for model in models):
+            for model in models:
+                model.close()
+            return steps
+
+        # Random actions of the flat action space, so the batch model can take them too
+        actions = []
+        for model, rng in zip(models, rngs):
+            available = [action for action in model.get_available_actions() if action[1] < model.num_delays]
+            actions.append(rng.choice(available) if not model.game_over else (0, 0))
+        for model, twin, action in zip(models, twins, actions):
+            if not model.game_over:
+                model.execute_move(action)
+                twin.execute_move(action)
+        batch.step(np.array(actions))
+        steps += 1
+
+
+if __name__ == "__main__":
+    # Usage: python JobReplayCheck.py [num_games] [dataset ...]
+    # Replays random games against the reference scans, stops with an AssertionError at the first difference
+    num_games = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_GAMES
+    datasets = sys.argv[2:] or DATASETS
+    for dataset in datasets:
+        steps = replay(dataset, num_games)
+        print(f"{dataset:12s} {num_games} games {steps:6d} steps   ok")
@@ -0,0 +1,569 @@
+import numpy as np
+import csv
+import hashlib
+import heapq
+import os
+import zipfile
+from collections import OrderedDict, deque
+from types import MappingProxyType
+
+SCENARIO_CACHE_DIR = "./.scenario_cache"    # Directory of the compiled scenarios (None to only cache in memory)
+SCENARIO_LRU_SIZE = 16                      # Number of compiled scenarios kept in memory
+COMPILED_FORMAT = 2                         # Version of the compiled file layout
+
+_scenario_lru = OrderedDict()   # (paths, mtimes, sizes) -> scenario
+
+
+class JobType:
+    """
+    Precomputed operation tables of a job type, shared by every job of the type.
+    Operation k drops the part of the column order[k] (0 based) of length lengths[k],
+    a column listed again is already empty (length 0). cumulative[k] is the length of the operations before k,
+    shapes[k] the shape of a job once k operations were dropped and piece_orders[k] its remaining order (1 based).
+    """
+    __slots__ = ("name", "id", "index", "order", "lengths", "cumulative", "shapes", "piece_orders")
+    name: str
+    id: int
+    index: int
+    order: tuple[int, ...]
+    lengths: tuple[int, ...]
+    cumulative: tuple[int, ...]
+    shapes: np.ndarray
+    piece_orders: tuple[tuple[int, ...], ...]
+
+    def __init__(self, name: str, index: int, order, shape: np.ndarray, type_id: int):
+        self.name = name
+        self.id = type_id                   # Grid id of the type
+        self.index = index                  # Position of the type in Scenario.job_data
+        self.order = tuple(col - 1 for col in order)
+        shapes = np.repeat(shape[None], len(self.order) + 1, axis=0)
+        lengths = []
+        for k, col in enumerate(self.order):
+            lengths.append(int(shapes[k, col].sum()))
+            shapes[k + 1:, col] = 0
+        shapes.setflags(write=False)
+        self.lengths = tuple(lengths)
+        self.cumulative = tuple(int(i) for i in np.cumsum([0] + lengths))
+        self.shapes = shapes
+        self.piece_orders = tuple(tuple(col + 1 for col in self.order[k:]) for k in range(len(self.order) + 1))
+
+    def __reduce__(self):
+        return (JobType, (self.name, self.index, [col + 1 for col in self.order], np.array(self.shapes[0]), self.id))
+
+    def __deepcopy__(self, memo):
+        return self         # Read only, shared like the scenario
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+
+class Scenario:
+    """
+    Read-only description of a factory: the job types, the setup times and the jobs of the schedule.
+    A scenario is shared by reference between all the models, jobs and environments built from it,
+    so one process can host schedules of different data sets without parsing anything per instance.
+    """
+    job_data: MappingProxyType      # job name -> (operation order, shape, grid id)
+    job_types: MappingProxyType     # job name -> JobType, the precomputed operations of the type
+    job_id: MappingProxyType        # grid id -> job name
+    setup_rules: MappingProxyType   # column name -> job name before -> job name after -> setup time
+    setup_tensor: np.ndarray        # Setup times indexed by (column, grid id before, grid id after)
+    max_setup_time: int             # Maximum setup time
+    num_types: int                  # Number of types of job
+    num_cols: int                   # Number of columns
+    max_job_height: int
+    grid_info: tuple[str, ...]      # Header of the job info file
+    jobs: tuple[tuple[str, ...], ...]   # Rows of the job info file (job index, job type, release time)
+    release_times: np.ndarray       # Release time of each row of jobs
+    arrival_order: np.ndarray       # Rows of jobs by release time (file order for equal times)
+    arrival_times: np.ndarray       # Release time of each row of arrival_order
+    paths: tuple[str, str, str]     # Type info, setup and job info files
+    stream_jobs: bool               # Jobs are read lazily from the job info file instead of jobs (see JobStream)
+
+    def __init__(self, job_data: dict, job_id: dict, setup_rules: dict, setup_tensor: np.ndarray, max_setup_time: int,
+                 num_types: int, num_cols: int, max_job_height: int, grid_info: list, jobs: list, paths: tuple = None,
+                 stream_jobs: bool = False):
+        for order, shape, _ in job_data.values():
+            shape.setflags(write=False)
+        setup_tensor.setflags(write=False)
+
+        # Release time index of the jobs, so arrivals are found without scanning or comparing strings
+        release_times = np.array([int(i[2]) for i in jobs], dtype=np.int64)
+        arrival_order = np.argsort(release_times, kind="stable")
+        arrival_times = release_times[arrival_order]
+        for array in (release_times, arrival_order, arrival_times):
+            array.setflags(write=False)
+        fields = {
+            "job_data": MappingProxyType({name: tuple(value) for name, value in job_data.items()}),
+            "job_types": MappingProxyType({
+                name: JobType(name, index, order, shape, type_id) for index, (name, (order, shape, type_id)) in enumerate(job_data.items())
+            }),
+            "job_id": MappingProxyType(dict(job_id)),
+            "setup_rules": MappingProxyType(setup_rules),
+            "setup_tensor": setup_tensor,
+            "max_setup_time": max_setup_time,
+            "num_types": num_types,
+            "num_cols": num_cols,
+            "max_job_height": max_job_height,
+            "grid_info": tuple(grid_info),
+            "jobs": tuple(tuple(i) for i in jobs),
+            "release_times": release_times,
+            "arrival_order": arrival_order,
+            "arrival_times": arrival_times,
+            "paths": paths,
+            "stream_jobs": stream_jobs,
+        }
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Scenario is read only")
+
+    def __reduce__(self):
+        # Pickled by value, so a scenario can be sent to worker processes
+        return (Scenario, (dict(self.job_data), dict(self.job_id), dict(self.setup_rules), self.setup_tensor, self.max_setup_time,
+                           self.num_types, self.num_cols, self.max_job_height, list(self.grid_info), list(self.jobs), self.paths,
+                           self.stream_jobs))
+
+    def __deepcopy__(self, memo):
+        return self         # Read only, shared by reference even by deep copies of the models
+
+    def __repr__(self) -> str:
+        jobs = "streamed" if self.stream_jobs else len(self.jobs)
+        return f"Scenario({self.paths}, {jobs} jobs, {self.num_types} types, {self.num_cols} columns)"
+
+    @classmethod
+    def load(cls, type_info_file: str, setup_file: str, job_info_file: str, stream_jobs: bool = False) -> "Scenario":
+        """
+        Load the (shared) scenario described by the three csv files.
+        """
+        return load_scenario(type_info_file, setup_file, job_info_file, stream_jobs)
+
+    def open_arrivals(self):
+        """
+        Get the queue of the upcoming jobs of a new schedule: a JobStream of the job info file in streaming mode,
+        otherwise an ArrivalQueue over the release time index, both open to submitted jobs (see PendingJobs).
+        """
+        if self.stream_jobs:
+            return PendingJobs(JobStream(self.paths[2]))
+        return PendingJobs(ArrivalQueue(self))
+
+
+class ArrivalQueue:
+    """
+    Upcoming jobs of a schedule by release time, a cursor into the release time index of the scenario.
+    Releasing the jobs of a time unit costs O(arrivals), whatever the order of the job info file.
+    """
+    scenario: Scenario
+    position: int
+
+    def __init__(self, scenario: Scenario, position: int = 0):
+        self.scenario = scenario
+        self.position = position        # Number of jobs released
+
+    def next_release(self) -> int:
+        """
+        Get the release time of the next job (None if no job is left).
+        """
+        if self.position >= len(self.scenario.arrival_times):
+            return None
+        return int(self.scenario.arrival_times[self.position])
+
+    def pop(self) -> tuple[str, int]:
+        """
+        Release the next job, return its job type and release time.
+        """
+        row = self.scenario.arrival_order[self.position]
+        self.position += 1
+        return self.scenario.jobs[row][1], int(self.scenario.release_times[row])
+
+    def fork(self) -> "ArrivalQueue":
+        return ArrivalQueue(self.scenario, self.position)
+
+
+class JobStream:
+    """
+    Upcoming jobs of a schedule read lazily from a job info file, in constant memory.
+    The file is expected in release time order: only the next row is read ahead,
+    a job listed after later ones is released with them, keeping its own release time.
+    Forks share the row read ahead and only open the file again when they release it.
+    """
+    path: str
+    offset: int
+    head: tuple[str, int]
+    rows: object
+    position: int
+
+    def __init__(self, path: str, offset: int = None, head: tuple[str, int] = None, position: int = 0):
+        self.path = path
+        self.offset = offset            # File position after head (None before the header is read)
+        self.head = head                # (job type, release time) of the next job, None if not read yet
+        self.rows = None                # Generator of the rows after offset, opened on demand
+        self.position = position        # Number of jobs released
+
+    def next_release(self) -> int:
+        """
+        Get the release time of the next job (None if no job is left).
+        """
+        if self.head is None:
+            self._read()
+        return None if self.head is None else self.head[1]
+
+    def pop(self) -> tuple[str, int]:
+        """
+        Release the next job, return its job type and release time.
+        """
+        if self.head is None:
+            self._read()
+        job = self.head
+        self.head = None
+        self.position += 1
+        return job
+
+    def fork(self) -> "JobStream":
+        if self.head is None:
+            self._read()
+        return JobStream(self.path, self.offset, self.head, self.position)
+
+    def __getstate__(self) -> dict:
+        """
+        Pickle and copy without the open generator of rows, the copy opens the file again at offset (as a fork).
+        """
+        state = self.__dict__.copy()
+        state["rows"] = None
+        return state
+
+    def _read(self):
+        if self.rows is None:
+            self.rows = read_job_rows(self.path, self.offset)
+        row = next(self.rows, None)
+        if row is not None:
+            job_type, release_time, self.offset = row
+            self.head = (job_type, release_time)
+
+
+class PendingJobs:
+    """
+    Upcoming jobs of a schedule by release time: the jobs of the scenario (an ArrivalQueue or a JobStream)
+    merged with the jobs submitted while the schedule runs, kept in a heap.
+    At equal release times, the jobs of the scenario come first, then the submitted ones in submission order.
+    """
+    source: object
+    submitted: list[tuple[int, int, str]]
+    sequence: int
+    position: int
+
+    def __init__(self, source, submitted: list = None, sequence: int = 0, position: int = 0):
+        self.source = source
+        self.submitted = [] if submitted is None else submitted    # Heap of (release time, submission number, job type)
+        self.sequence = sequence                                    # Number of jobs submitted
+        self.position = position                                    # Number of jobs released
+
+    def __len__(self) -> int:
+        """
+        Number of submitted jobs not released yet.
+        """
+        return len(self.submitted)
+
+    def push(self, job_type: str, release_time: int):
+        heapq.heappush(self.submitted, (release_time, self.sequence, job_type))
+        self.sequence += 1
+
+    def next_release(self) -> int:
+        """
+        Get the release time of the next job (None if no job is left).
+        """
+        release_time = self.source.next_release()
+        if self.submitted and (release_time is None or self.submitted[0][0] < release_time):
+            return self.submitted[0][0]
+        return release_time
+
+    def pop(self) -> tuple[str, int]:
+        """
+        Release the next job, return its job type and release time.
+        """
+        self.position += 1
+        release_time = self.source.next_release()
+        if self.submitted and (release_time is None or self.submitted[0][0] < release_time):
+            release_time, _, job_type = heapq.heappop(self.submitted)
+            return job_type, release_time
+        return self.source.pop()
+
+    def fork(self) -> "PendingJobs":
+        return PendingJobs(self.source.fork(), list(self.submitted), self.sequence, self.position)
+
+
+def load_scenario(type_info_file: str, setup_file: str, job_info_file: str, stream_jobs: bool = False) -> Scenario:
+    """
+    Load the scenario described by the three csv files.
+    Compiled scenarios are kept in an in-process LRU keyed by the paths and modification times,
+    and in a .npz file keyed by the paths, content hashes and modification times,
+    so the csv files are only parsed when one of them changed.
+    With stream_jobs, only the header of the job info file is read: each schedule reads its jobs lazily
+    (see JobStream), and the scenario is not written to the .npz cache.
+    The returned scenario is shared by every caller.
+    """
+    paths = tuple(os.path.abspath(i) for i in (type_info_file, setup_file, job_info_file))
+    stats = [os.stat(i) for i in paths]
+    mtimes = tuple(i.st_mtime_ns for i in stats)
+    key = (paths, mtimes, tuple(i.st_size for i in stats), stream_jobs)
+    scenario = _scenario_lru.get(key)
+    if scenario is not None:
+        _scenario_lru.move_to_end(key)
+        return scenario
+
+    arrays = None
+    cache_file = None
+    if stream_jobs:
+        arrays = compile_scenario(*paths, stream_jobs=True)
+    elif SCENARIO_CACHE_DIR is not None:
+        cache_file = os.path.join(SCENARIO_CACHE_DIR, hashlib.sha1("\n".join(paths).encode()).hexdigest() + ".npz")
+        arrays = _read_compiled(cache_file, paths, mtimes)
+    if arrays is None and not stream_jobs:
+        hashes = tuple(_hash_file(i) for i in paths)
+        if cache_file is not None:
+            arrays = _read_compiled(cache_file, paths, mtimes, hashes)
+        if arrays is None:
+            arrays = compile_scenario(*paths)
+            arrays["hashes"] = np.array(hashes)
+        if cache_file is not None:
+            _write_compiled(cache_file, arrays, paths, mtimes)      # Also refreshes the modification times
+    scenario = decode_scenario(arrays, paths, stream_jobs)
+
+    _scenario_lru[key] = scenario
+    while len(_scenario_lru) > SCENARIO_LRU_SIZE:
+        _scenario_lru.popitem(last=False)
+    return scenario
+
+def clear_scenario_cache():
+    """
+    Empty the in-process scenario cache.
+    """
+    _scenario_lru.clear()
+
+def compile_scenario(type_info_file: str, setup_file: str, job_info_file: str, stream_jobs: bool = False) -> dict[str, np.ndarray]:
+    """
+    Parse the three csv files into flat arrays, the layout of the compiled .npz file.
+    With stream_jobs, only the header of the job info file is read and jobs is empty.
+    """
+    job_data, piece_info, job_id, max_job_height = handle_type_info_file(type_info_file)
+    type_names = list(job_data.keys())
+    setup_rule, max_setup_time = handle_setup_file(setup_file, type_names)
+    num_types = int(piece_info[0][1])
+    num_cols = int(piece_info[0][3])
+
+    # Ragged operation orders are stored flat, job shapes are padded to the widest one
+    orders = [list(job_data[i][0]) for i in type_names]
+    shapes = [job_data[i][1] for i in type_names]
+    num_rows = max([i.shape[0] for i in shapes], default=0)
+    widths = [i.shape[1] for i in shapes]
+    padded = np.zeros((len(shapes), num_rows, max(widths, default=0)), dtype=int)
+    for i, shape in enumerate(shapes):
+        padded[i, :shape.shape[0], :shape.shape[1]] = shape
+
+    with open(job_info_file, encoding='utf-8-sig') as file:
+        if stream_jobs:
+            lines = [next(csv.reader([file.readline()]))]
+        else:
+            lines = list(csv.reader(file))
+    jobs = [line[:3] for line in lines[2:] if len(line) >= 3 and line[2] != '']
+
+    return {
+        "type_names": np.array(type_names, dtype=str),
+        "type_ids": np.array([job_data[i][2] for i in type_names], dtype=int),
+        "order_values": np.array([j for i in orders for j in i], dtype=int),
+        "order_lengths": np.array([len(i) for i in orders], dtype=int),
+        "shapes": padded,
+        "shape_rows": np.array([i.shape[0] for i in shapes], dtype=int),
+        "shape_widths": np.array(widths, dtype=int),
+        "setup_columns": np.array(list(setup_rule.keys()), dtype=str),
+        "setup_tensor": compile_setup_tensor(setup_rule, job_data, num_types, num_cols),
+        "header": np.array([num_types, num_cols, max_setup_time, max_job_height], dtype=int),
+        "grid_info": np.array(lines[0], dtype=str),
+        "jobs": np.array(jobs, dtype=str).reshape(len(jobs), 3),
+    }
+
+def decode_scenario(arrays: dict[str, np.ndarray], paths: tuple = None, stream_jobs: bool = False) -> Scenario:
+    """
+    Rebuild the scenario used by the model from the compiled arrays.
+    """
+    num_types, num_cols, max_setup_time, max_job_height = (int(i) for i in arrays["header"])
+    type_names = arrays["type_names"].tolist()
+    job_data = {}
+    start = 0
+    for i, name in enumerate(type_names):
+        end = start + int(arrays["order_lengths"][i])
+        order = deque(arrays["order_values"][start:end].tolist())
+        shape = arrays["shapes"][i, :arrays["shape_rows"][i], :arrays["shape_widths"][i]].copy()
+        job_data[name] = [order, shape, int(arrays["type_ids"][i])]
+        start = end
+    job_id = {job_data[name][2]: name for name in type_names}
+
+    setup_tensor = arrays["setup_tensor"]
+    setup_rule = {}
+    for col_name in arrays["setup_columns"].tolist():
+        col = setup_tensor[(int(col_name[1:]) - 1) % num_cols]
+        setup_rule[col_name] = {a: {b: int(col[job_data[a][2], job_data[b][2]]) for b in type_names} for a in type_names}
+
+    return Scenario(job_data, job_id, setup_rule, setup_tensor, max_setup_time, num_types, num_cols, max_job_height,
+                    arrays["grid_info"].tolist(), arrays["jobs"].tolist(), paths, stream_jobs)
+
+def _hash_file(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+def _read_compiled(cache_file: str, paths: tuple, mtimes: tuple, hashes: tuple = None) -> dict[str, np.ndarray]:
+    """
+    Read a compiled scenario, return None if it is missing, stale, of another format or damaged
+    (then it is compiled and written again).
+    Without hashes the modification times have to match, otherwise the content hashes.
+    """
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with open(cache_file, "rb") as file, np.load(file) as data:
+            arrays = {i: data[i] for i in data.files}
+        if int(arrays.pop("cache_format", -1)) != COMPILED_FORMAT or tuple(arrays.pop("sources").tolist()) != paths:
+            return None
+        stored_mtimes = tuple(arrays.pop("mtimes").tolist())
+        if hashes is None:
+            return arrays if stored_mtimes == mtimes else None
+        return arrays if tuple(arrays["hashes"].tolist()) == hashes else None
+    except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile):
+        return None
+
+def _write_compiled(cache_file: str, arrays: dict[str, np.ndarray], paths: tuple, mtimes: tuple):
+    """
+    Write a compiled scenario next to the other ones, the file is replaced atomically.
+    """
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_file, cache_format=np.array(COMPILED_FORMAT), sources=np.array(paths), mtimes=np.array(mtimes, dtype=np.int64), **arrays)
+    os.replace(tmp_file, cache_file)
+
+# ========================================================================================================
+# CSV parsing functions below
+# ========================================================================================================
+def read_job_rows(job_info_file: str, offset: int = None):
+    """
+    Generator of the jobs of the job info file, read one line at a time.
+    Starts after the two header lines, or at the file position offset.
+    yield (job type, release time, file position after the row), blank rows are skipped.
+    """
+    with open(job_info_file, encoding='utf-8-sig') as file:
+        if offset is None:
+            file.readline()
+            file.readline()
+        else:
+            file.seek(offset)
+        while True:
+            line = file.readline()
+            if not line:
+                return
+            row = next(csv.reader([line]), [])
+            if len(row) < 3 or row[2] == '':
+                continue
+            yield row[1], int(row[2]), file.tell()
+
+def handle_type_info_file(type_info_file: str):
+    """
+    Handle the type info file and 
+    return the job model and the piece info.
+    """
+    max_job_height = 0
+    id_dict = {}
+    cur_id = 2
+    piece_info = []
+    i = 0
+    with open(type_info_file, encoding='utf-8-sig') as file:
+        data = {}
+        for line in csv.reader(file):
+            if i < 2:
+                piece_info.append(line)
+                i += 1
+            else:
+                if line[0] != '':
+                    key = line[0]
+                    order = line[1].split(",")
+                    cur_data = line[2:]
+                    order, shape, height = get_job_model(cur_data, order)
+                    if height > max_job_height:
+                        max_job_height = height
+                    data[key] = [order, shape, cur_id]
+                    id_dict[cur_id] = key
+                    cur_id += 1
+    file.close()
+    return data, piece_info, id_dict, max_job_height
+
+def handle_setup_file(setup_file: str, job_list: list):
+    """
+    Handle the setup file
+    """
+    max_time = 0 # max time for a setup
+    setup_rule = {}
+    num_col = 0
+    num_job = 0
+    cur_col = [0, None]
+    cur_job = 0
+    first_line = True
+    with open(setup_file, encoding='utf-8-sig') as file:
+        for line in csv.reader(file):
+            if first_line:
+                first_line = False
+                num_col = int(line[1])
+                num_job = int(line[3])
+            else:
+                if cur_col[0] > num_col:
+                    break
+                if cur_job == 0:
+                    cur_col[1] = line[0]
+                    setup_rule[line[0]] = {}
+                    for i in job_list:
+                        setup_rule[line[0]][i] = {}
+                        for j in job_list:
+                            setup_rule[line[0]][i][j] = 0
+                    cur_job += 1
+                else:
+                    job_name = line[0]
+                    for i in range(1, len(line)):
+                        setup_rule[cur_col[1]][job_name][job_list[i - 1]] = int(line[i])
+                        if int(line[i]) > max_time:
+                            max_time = int(line[i])
+                    cur_job += 1
+                    if cur_job > num_job:
+                        cur_job = 0
+                        cur_col[0] += 1
+    file.close()
+    return setup_rule, max_time
+
+def compile_setup_tensor(setup_rule: dict, job_data: dict, num_types: int, num_cols: int) -> np.ndarray:
+    """
+    Compile the setup rules into a dense array indexed by (column, grid id before, grid id after).
+    The setup rule of the column name "M" + str(col + 1) is stored at col % num_cols,
+    grid ids 0 (free) and 1 (setup) have no setup time.
+    """
+    tensor = np.zeros((num_cols, num_types + 2, num_types + 2), dtype=int)
+    for col_name, rules in setup_rule.items():
+        col = (int(col_name[1:]) - 1) % num_cols
+        for before, row in rules.items():
+            for after, time in row.items():
+                tensor[col, job_data[before][2], job_data[after][2]] = time
+    return tensor
+
+def get_job_model(lst: list, order: list):
+    """
+    Get the job nparray model from the list of job info.
+    """
+    pointer = 0
+    int_order = deque()
+    col = sum([int(i) for i in lst])
+    shape = np.zeros((len(lst), col), dtype=int)
+    for i in order:
+        i = int(i)
+        int_order.append(i)
+        cur_row = shape[i - 1]
+        cur_len = int(lst[i - 1])
+        for j in range(cur_len):
+            cur_row[pointer + j] = 1
+        pointer += cur_len
+    return int_order, shape, col
@@ -0,0 +1,346 @@
+import JobModel
+import traceback
+import gymnasium as gym
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from JobEnvironment import symbolic_observation, symbolic_observation_space
+from JobRenderer import NumpyRenderer, SCREEN_SIZE
+
+NUM_ENVS = 8        # Default number of models stepped together
+NUM_WORKERS = 4     # Default number of worker processes of the async vector env
+
+
+class JobSchedulerVectorEnv:
+    """
+    Synchronous vectorized version of JobSchedulerEnv, steps num_envs models in lockstep.
+    The observations, rewards, dones and action masks are written into preallocated stacked buffers,
+    which are returned by step and reset and overwritten by the next call (copy them to keep them).
+    A finished episode is reset right away from the shared scenario: its row of the buffers holds the
+    first observation of the next episode, and the infos hold the total reward and length of the finished one.
+    """
+    scenario: JobModel.Scenario
+    num_envs: int
+    num_slots: int
+    ranking: type
+    models: list[JobModel.ScheduleModel]
+    obs_mode: str
+    rasterizer: NumpyRenderer
+    single_action_space: gym.spaces.Discrete
+    single_observation_space: gym.spaces.Space
+    observations: object
+    rewards: np.ndarray
+    dones: np.ndarray
+    action_masks: np.ndarray
+    episode_rewards: np.ndarray
+    episode_lengths: np.ndarray
+    lengths: np.ndarray
+
+    def __init__(self, num_envs: int = NUM_ENVS, scenario: JobModel.Scenario = None, obs_mode="symbolic", screen_size=SCREEN_SIZE,
+                 num_slots: int = JobModel.NUM_BLOCKS, ranking: type = None):
+        # All the models share one scenario and the slot window (see JobModel.ScheduleModel)
+        self.scenario = scenario if scenario is not None else JobModel.default_scenario()
+        self.num_envs = num_envs
+        self.num_slots = num_slots
+        self.ranking = ranking
+        self.models = [self.new_model() for _ in range(num_envs)]
+        self.obs_mode = obs_mode
+        self.rasterizer = None
+
+        # Spaces of one environment, as in JobSchedulerEnv (rgb frames are drawn by the numpy renderer)
+        model = self.models[0]
+        self.single_action_space = gym.spaces.Discrete(model.get_action_space_size())
+        if obs_mode == "symbolic":
+            self.single_observation_space = symbolic_observation_space(model)
+            self.observations = {
+                key: np.zeros((num_envs, *box.shape), dtype=box.dtype) for key, box in self.single_observation_space.spaces.items()
+            }
+        elif obs_mode == "rgb":
+            self.rasterizer = NumpyRenderer(self.scenario.num_types, screen_size, num_slots)
+            self.single_observation_space = gym.spaces.Box(low=0, high=255, shape=(*screen_size, 3), dtype=np.uint8)
+            self.observations = np.zeros((num_envs, *screen_size, 3), dtype=np.uint8)
+        else:
+            raise ValueError(f"Unknown obs_mode: {obs_mode}")
+
+        # Stacked buffers, one row per model
+        self.rewards = np.zeros(num_envs, dtype=np.int64)
+        self.dones = np.zeros(num_envs, dtype=bool)
+        self.action_masks = np.zeros((num_envs, self.single_action_space.n), dtype=bool)
+        self.episode_rewards = np.zeros(num_envs, dtype=np.int64)      # Total reward of the episodes finished by the last step
+        self.episode_lengths = np.zeros(num_envs, dtype=np.int64)      # Length of the episodes finished by the last step
+        self.lengths = np.zeros(num_envs, dtype=np.int64)              # Steps of the running episodes
+
+    def buffers(self) -> dict[str, np.ndarray]:
+        """
+        Get the stacked buffers by name, the observation buffers are named "obs" or "obs/<key>".
+        """
+        buffers = {"obs/" + key: value for key, value in self.observations.items()} if self.obs_mode == "symbolic" else {"obs": self.observations}
+        buffers.update(rewards=self.rewards, dones=self.dones, action_masks=self.action_masks,
+                       episode_rewards=self.episode_rewards, episode_lengths=self.episode_lengths)
+        return buffers
+
+    def attach(self, buffers: dict[str, np.ndarray]):
+        """
+        Write into the given buffers instead of its own, buffers has the names and shapes of self.buffers().
+        """
+        if self.obs_mode == "symbolic":
+            self.observations = {key[4:]: value for key, value in buffers.items() if key.startswith("obs/")}
+        else:
+            self.observations = buffers["obs"]
+        self.rewards = buffers["rewards"]
+        self.dones = buffers["dones"]
+        self.action_masks = buffers["action_masks"]
+        self.episode_rewards = buffers["episode_rewards"]
+        self.episode_lengths = buffers["episode_lengths"]
+
+    def new_model(self) -> JobModel.ScheduleModel:
+        model = JobModel.ScheduleModel(self.scenario, num_slots=self.num_slots, ranking=self.ranking, verbose=False)
+        model.start_game()
+        return model
+
+    def reset(self, seed=None):
+        """
+        Reset all the models, return the stacked observations and infos.
+        The models are deterministic, the seed is only accepted for compatibility.
+        """
+        for model in self.models:
+            model.close()
+        self.models = [self.new_model() for _ in range(self.num_envs)]
+        self.rewards[:] = 0
+        self.dones[:] = False
+        self.lengths[:] = 0
+        for i in range(self.num_envs):
+            self.write(i)
+        return self.observations, self.infos()
+
+    def step(self, actions):
+        """
+        Execute one action per model, actions are (block, delay) tuples or flat indices as in JobSchedulerEnv.step.
+        return the stacked observations, rewards, dones and infos.
+        """
+        self.episode_rewards[:] = 0
+        self.episode_lengths[:] = 0
+        for i, (model, action) in enumerate(zip(self.models, actions)):
+            model.execute_move(tuple(action) if np.ndim(action) else action)
+            self.lengths[i] += 1
+            self.rewards[i] = model.step_reward
+            self.dones[i] = model.game_over
+            if model.game_over:
+                self.episode_rewards[i] = model.total_reward
+                self.episode_lengths[i] = self.lengths[i]
+                self.lengths[i] = 0
+                model.close()
+                model = self.models[i] = self.new_model()
+            self.write(i)
+        return self.observations, self.rewards, self.dones, self.infos()
+
+    def write(self, i: int):
+        """
+        Write the observation and action mask of model i into the buffers.
+        """
+        model = self.models[i]
+        if self.obs_mode == "symbolic":
+            symbolic_observation(model, {key: value[i] for key, value in self.observations.items()})
+        else:
+            self.rasterizer.render(model, self.observations[i])
+        self.action_masks[i] = model.action_mask
+
+    def infos(self) -> dict:
+        return {
+            "action_mask": self.action_masks,
+            "episode_reward": self.episode_rewards,
+            "episode_length": self.episode_lengths,
+        }
+
+    def get_available_actions(self) -> list[list[tuple[int, int]]]:
+        return [model.get_available_actions() for model in self.models]
+
+    def close(self):
+        for model in self.models:
+            model.close()
+        self.models = []
+
+
+class JobSchedulerAsyncVectorEnv:
+    """
+    Vectorized JobSchedulerEnv running the models in num_workers processes, each worker steps its share
+    of the models with a JobSchedulerVectorEnv.
+    The actions and all the stacked buffers (same as JobSchedulerVectorEnv) live in shared memory:
+    the workers write the observations and action masks in place, only short commands go through the pipes.
+    step_async sends the actions and returns at once, step_wait waits for the workers and returns the buffers.
+    """
+    num_envs: int
+    num_workers: int
+    single_action_space: gym.spaces.Discrete
+    single_observation_space: gym.spaces.Space
+    shared: list[shared_memory.SharedMemory]
+    arrays: dict[str, np.ndarray]
+    actions: np.ndarray
+    num_delays: int
+    observations: object
+    pipes: list
+    processes: list
+    waiting: bool
+
+    def __init__(self, num_envs: int = NUM_ENVS, num_workers: int = NUM_WORKERS, scenario: JobModel.Scenario = None,
+                 obs_mode="symbolic", screen_size=SCREEN_SIZE, context: str = None, num_slots: int = JobModel.NUM_BLOCKS, ranking: type = None):
+        scenario = scenario if scenario is not None else JobModel.default_scenario()
+        num_workers = max(1, min(num_workers, num_envs))
+        self.num_envs = num_envs
+        self.num_workers = num_workers
+        self.waiting = False
+
+        # A local vector env of one model gives the spaces and the layout of the buffers
+        template = JobSchedulerVectorEnv(1, scenario, obs_mode, screen_size, num_slots, ranking)
+        self.single_action_space = template.single_action_space
+        self.single_observation_space = template.single_observation_space
+        specs = {name: ((num_envs, *value.shape[1:]), value.dtype.str) for name, value in template.buffers().items()}
+        specs["actions"] = ((num_envs,), np.dtype(np.int64).str)
+        self.num_delays = template.models[0].num_delays
+
+        # Allocate the shared buffers
+        self.shared = []
+        self.arrays = {}
+        for name, (shape, dtype) in specs.items():
+            memory = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize))
+            self.shared.append(memory)
+            self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+            self.arrays[name][:] = 0
+        self.actions = self.arrays["actions"]
+        if obs_mode == "symbolic":
+            self.observations = {name[4:]: value for name, value in self.arrays.items() if name.startswith("obs/")}
+        else:
+            self.observations = self.arrays["obs"]
+        shm_names = {name: (memory.name, *specs[name]) for name, memory in zip(specs, self.shared)}
+
+        # Start the workers, each one gets a contiguous range of the models
+        ctx = mp.get_context(context)
+        bounds = np.linspace(0, num_envs, num_workers + 1).astype(int)
+        self.pipes = []
+        self.processes = []
+        for low, high in zip(bounds[:-1], bounds[1:]):
+            parent, child = ctx.Pipe()
+            process = ctx.Process(target=_worker, args=(child, parent, scenario, obs_mode, screen_size, num_slots, ranking, int(low), int(high), shm_names), daemon=True)
+            process.start()
+            child.close()
+            self.pipes.append(parent)
+            self.processes.append(process)
+
+    def reset(self, seed=None):
+        """
+        Reset all the models, return the stacked observations and infos.
+        """
+        self.send(("reset", None))
+        self.receive()
+        return self.observations, self.infos()
+
+    def step_async(self, actions):
+        """
+        Write the actions, (block, delay) tuples or flat indices as in JobSchedulerEnv.step, and start the step of every worker.
+        """
+        if self.waiting:
+            raise RuntimeError("step_async called again before step_wait")
+        actions = np.asarray(actions, dtype=np.int64)
+        self.actions[:] = actions if actions.ndim == 1 else JobModel.encode_actions(actions, self.num_delays)
+        self.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self):
+        """
+        Wait for the step started by step_async, return the stacked observations, rewards, dones and infos.
+        """
+        if not self.waiting:
+            raise RuntimeError("step_wait called without step_async")
+        self.waiting = False
+        self.receive()
+        return self.observations, self.arrays["rewards"], self.arrays["dones"], self.infos()
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def infos(self) -> dict:
+        return {
+            "action_mask": self.arrays["action_masks"],
+            "episode_reward": self.arrays["episode_rewards"],
+            "episode_length": self.arrays["episode_lengths"],
+        }
+
+    def send(self, command: tuple):
+        for pipe in self.pipes:
+            pipe.send(command)
+
+    def receive(self):
+        errors = [message for message in (pipe.recv() for pipe in self.pipes) if message is not None]
+        if errors:
+            raise RuntimeError("Worker failed:\n" + errors[0])
+
+    def close(self):
+        if not getattr(self, "processes", None):
+            return
+        if self.waiting:
+            self.waiting = False
+            try:
+                self.receive()
+            except RuntimeError:
+                pass
+        for pipe in self.pipes:
+            try:
+                pipe.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.pipes = []
+        self.processes = []
+        self.arrays = {}
+        self.actions = None
+        self.observations = None
+        for memory in self.shared:
+            memory.close()
+            memory.unlink()
+        self.shared = []
+
+    def __del__(self):
+        self.close()
+
+
+def _worker(pipe, parent_pipe, scenario: JobModel.Scenario, obs_mode: str, screen_size: tuple[int, int], num_slots: int, ranking: type,
+            low: int, high: int, shm_names: dict):
+    """
+    Worker process of JobSchedulerAsyncVectorEnv, steps the models low to high - 1 on the shared buffers.
+    Answers each command with None, or the traceback if it failed.
+    """
+    parent_pipe.close()
+    shared = [shared_memory.SharedMemory(name=name) for name, _, _ in shm_names.values()]
+    arrays = {
+        key: np.ndarray(shape, dtype=dtype, buffer=memory.buf)[low:high]
+        for (key, (_, shape, dtype)), memory in zip(shm_names.items(), shared)
+    }
+    env = None
+    try:
+        env = JobSchedulerVectorEnv(high - low, scenario, obs_mode, screen_size, num_slots, ranking)
+        env.attach(arrays)
+        while True:
+            command, _ = pipe.recv()
+            try:
+                if command == "step":
+                    env.step(arrays["actions"].tolist())
+                elif command == "reset":
+                    env.reset()
+                elif command == "close":
+                    break
+                pipe.send(None)
+            except Exception:
+                pipe.send(traceback.format_exc())
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        if env is not None:
+            env.close()
+        del env, arrays
+        for memory in shared:
+            memory.close()
+
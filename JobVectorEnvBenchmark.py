@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+import numpy as np
+from JobVectorEnv import JobSchedulerVectorEnv, JobSchedulerAsyncVectorEnv
+
+NUM_ENVS = 32               # Number of models stepped together
+NUM_STEPS = 500             # Number of batched steps of each run
+WORKER_COUNTS = [1, 2, 4, 8, 16]    # Worker counts of the async runs (capped by the number of cpus)
+
+
+def random_actions(masks: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """
+    Pick a random available action for each row of the action masks, as flat indices.
+    """
+    return np.argmax(rng.random(masks.shape) * masks, axis=1)
+
+
+def run(env, num_steps: int) -> float:
+    """
+    Step the vector env with random actions, return the number of environment steps per second.
+    """
+    rng = np.random.default_rng(0)
+    _, infos = env.reset()
+    start = time.perf_counter()
+    for _ in range(num_steps):
+        _, _, _, infos = env.step(random_actions(infos["action_mask"], rng))
+    return num_steps * env.num_envs / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    # Usage: python JobVectorEnvBenchmark.py [num_envs] [num_steps]
+    num_envs = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_ENVS
+    num_steps = int(sys.argv[2]) if len(sys.argv) > 2 else NUM_STEPS
+    results = []
+
+    env = JobSchedulerVectorEnv(num_envs)
+    sync_rate = run(env, num_steps)
+    env.close()
+    results.append(f"sync           {sync_rate:10.0f} steps/s")
+
+    for workers in [i for i in WORKER_COUNTS if i <= (os.cpu_count() or 1)]:
+        env = JobSchedulerAsyncVectorEnv(num_envs, workers)
+        rate = run(env, num_steps)
+        env.close()
+        results.append(f"async {workers:2d} workers {rate:10.0f} steps/s   {rate / sync_rate:5.2f}x sync")
+
+    print(f"{num_envs} envs, {num_steps} steps, {os.cpu_count()} cpus")
+    print("\n".join(results))